@@ -0,0 +1,388 @@
+import re
+import json
+import time
+import uuid
+import sqlite3
+import threading
+import asyncio
+import hashlib
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from pydantic import ValidationError
+
+from app.llm import LLMEngine, get_engine
+from app.models import ConversationFeedback
+from functions.config import settings
+
+ANALYSIS_PROMPT = """
+Analyze the conversation between the sales specialist and customer for:
+- strengths: What communication techniques worked well (list of strings)
+- weaknesses: Areas where communication could be improved (list of strings)
+- key_moments: Critical turning points in the conversation (list of strings)
+{suggestions}- role_specific_feedback: Tailored advice based on whether the user was acting as the sales specialist or customer (string)
+
+Return only a JSON object with exactly these keys.
+"""
+
+SUGGESTIONS_ITEM = "- improvement_suggestions: Specific, actionable tips for more effective communication (list of strings)\n"
+
+# Feedback sections the model is asked for, used to normalize near-miss keys
+FEEDBACK_KEYS = set(ConversationFeedback.model_fields)
+
+CODE_FENCE = re.compile(r"^```[a-zA-Z]*\s*|\s*```$")
+
+
+def _close_json(text: str) -> str:
+    """Close any string, array or object left open by a truncated JSON document"""
+    stack = []
+    in_string = False
+    escaped = False
+    for ch in text:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch in "{[":
+            stack.append("}" if ch == "{" else "]")
+        elif ch in "}]" and stack:
+            stack.pop()
+    return text + ('"' if in_string else "") + "".join(reversed(stack))
+
+
+def repair_json(text: str) -> Optional[Dict[str, Any]]:
+    """Recover a JSON object from fenced, prefixed or truncated model output"""
+    text = CODE_FENCE.sub("", text.strip())
+    start = text.find("{")
+    if start < 0:
+        return None
+    text = text[start:]
+
+    candidates = []
+    end = text.rfind("}")
+    if end >= 0:
+        candidates.append(text[:end + 1])
+    candidates.append(_close_json(text))
+    # Truncated mid-value: back off to each earlier element boundary and close from there
+    cut = len(text)
+    for _ in range(50):
+        cut = text.rfind(",", 0, cut)
+        if cut <= 0:
+            break
+        candidates.append(_close_json(text[:cut]))
+
+    for candidate in candidates:
+        try:
+            value = json.loads(candidate)
+        except json.JSONDecodeError:
+            continue
+        if isinstance(value, dict):
+            return value
+    return None
+
+
+def parse_feedback(text: str, include_suggestions: bool = True) -> Dict[str, Any]:
+    """Parse and validate model feedback, repairing recoverable output locally"""
+    try:
+        raw = json.loads(text)
+    except json.JSONDecodeError:
+        raw = repair_json(text)
+    if not isinstance(raw, dict):
+        return {"error": "Unable to parse analysis response as JSON."}
+
+    # Normalize keys such as "Key Moments" or "role-specific feedback"
+    normalized = {re.sub(r"[\s\-]+", "_", key.strip().lower()): value for key, value in raw.items()}
+    if not FEEDBACK_KEYS & set(normalized):
+        return {"error": "Analysis response did not contain any feedback sections."}
+    if not include_suggestions:
+        normalized.pop("improvement_suggestions", None)
+
+    try:
+        feedback = ConversationFeedback.model_validate(normalized)
+    except ValidationError as e:
+        return {"error": f"Analysis response did not match the feedback schema. Details: {e.error_count()} errors"}
+    return feedback.model_dump(exclude_none=True)
+
+SEGMENT_PROMPT = """
+You are reviewing one part of a longer sales role-play conversation between a sales specialist and a customer.
+The user is acting as the {system_role}. Write concise coaching notes for this part only:
+communication techniques that worked, weaknesses, and key moments. Reply with plain bullet points.
+"""
+
+
+def transcript_hash(system_role: str, messages: List[Dict[str, str]], *options: Any) -> str:
+    """Stable hash of a transcript, the user's role and any analysis options"""
+    payload = json.dumps([system_role, messages, *options], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ConversationAnalyzer:
+    """Analyzes transcripts incrementally: closed segments are summarized once and reused"""
+
+    def __init__(self, engine: LLMEngine, segment_messages: int = 20, max_cached_segments: int = 2000):
+        self.engine = engine
+        self.segment_messages = segment_messages
+        self.max_cached_segments = max_cached_segments
+        self._segment_notes: "OrderedDict[str, str]" = OrderedDict()
+
+    async def _segment_notes_for(self, system_role: str, segment: List[Dict[str, str]]) -> str:
+        key = transcript_hash(system_role, segment)
+        notes = self._segment_notes.get(key)
+        if notes is not None:
+            self._segment_notes.move_to_end(key)
+            return notes
+
+        response = await self.engine.chat(
+            model=settings.openai_model,
+            messages=[{"role": "system", "content": SEGMENT_PROMPT.format(system_role=system_role)}] + segment,
+            temperature=0.3,
+            max_tokens=300
+        )
+        notes = response.choices[0].message.content.strip()
+        self._segment_notes[key] = notes
+        while len(self._segment_notes) > self.max_cached_segments:
+            self._segment_notes.popitem(last=False)
+        return notes
+
+    async def analyze(
+        self,
+        system_role: str,
+        transcript: List[Dict[str, str]],
+        include_suggestions: bool = True
+    ) -> Dict[str, Any]:
+        """Analyze a transcript (without the system prompt) and return feedback"""
+        if not transcript:
+            return {"error": "Not enough conversation history to analyze."}
+
+        # Everything before the open tail is cut into fixed segments, analyzed once and cached
+        closed = (len(transcript) - 1) // self.segment_messages * self.segment_messages
+        segments = [
+            transcript[start:start + self.segment_messages]
+            for start in range(0, closed, self.segment_messages)
+        ]
+        tail = transcript[closed:]
+
+        try:
+            notes = await asyncio.gather(*(self._segment_notes_for(system_role, segment) for segment in segments))
+
+            prompt = ANALYSIS_PROMPT.format(suggestions=SUGGESTIONS_ITEM if include_suggestions else "")
+            analysis_messages = [{"role": "system", "content": prompt}]
+            if notes:
+                earlier = "\n\n".join(f"Part {i + 1}:\n{text}" for i, text in enumerate(notes))
+                analysis_messages.append({
+                    "role": "system",
+                    "content": f"Coaching notes on the earlier parts of this conversation:\n{earlier}\n\n"
+                               "The most recent turns follow. Cover the whole conversation in your analysis."
+                })
+            analysis_messages += tail
+
+            # Get analysis from OpenAI in JSON mode; skipping suggestions also shrinks the generation budget
+            response = await self.engine.chat(
+                model=settings.openai_model,
+                messages=analysis_messages,
+                temperature=0.3,
+                max_tokens=1000 if include_suggestions else 700,
+                response_format={"type": "json_object"}
+            )
+
+            # Validate against the feedback schema, repairing fenced or truncated output locally
+            return parse_feedback(response.choices[0].message.content, include_suggestions)
+
+        except Exception as e:
+            return {"error": f"Unable to analyze conversation. Details: {str(e)}"}
+
+
+class AnalysisJob:
+    """A background analysis of one session's transcript"""
+
+    def __init__(self, session_id: str, history_hash: str):
+        self.job_id = uuid.uuid4().hex
+        self.session_id = session_id
+        self.history_hash = history_hash
+        self.status = "pending"
+        self.result: Optional[Dict[str, Any]] = None
+        self.task: Optional[asyncio.Task] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        if self.status == "done":
+            return {"status": "success", "job_id": self.job_id, "feedback": self.result}
+        if self.status == "error":
+            return {"status": "error", "job_id": self.job_id, "message": self.result["error"]}
+        return {"status": self.status, "job_id": self.job_id}
+
+
+class SQLiteJobStore:
+    """Shares analysis job status and results between worker processes"""
+
+    def __init__(
+        self,
+        path: str = "sessions.db",
+        ttl_seconds: float = 3600,
+        stale_seconds: float = 300,
+        busy_timeout: float = 5.0
+    ):
+        self.ttl_seconds = ttl_seconds
+        # Unfinished jobs not updated for this long are assumed lost with their worker
+        self.stale_seconds = stale_seconds
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._conn = sqlite3.connect(path, timeout=busy_timeout, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS analysis_jobs ("
+            "job_id TEXT PRIMARY KEY, session_id TEXT NOT NULL, history_hash TEXT NOT NULL, "
+            "status TEXT NOT NULL, result TEXT, updated_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS analysis_jobs_key ON analysis_jobs (session_id, history_hash)"
+        )
+
+    def put(self, job: "AnalysisJob"):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO analysis_jobs "
+                "(job_id, session_id, history_hash, status, result, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (job.job_id, job.session_id, job.history_hash, job.status,
+                 json.dumps(job.result) if job.result is not None else None, now)
+            )
+            self._writes += 1
+            if self._writes % 100 == 0:
+                self._conn.execute("DELETE FROM analysis_jobs WHERE updated_at < ?", (now - self.ttl_seconds,))
+
+    def _load(self, row) -> Optional["AnalysisJob"]:
+        if row is None:
+            return None
+        job_id, session_id, history_hash, status, result, updated_at = row
+        if status not in ("done", "error") and time.time() - updated_at > self.stale_seconds:
+            return None
+        job = AnalysisJob(session_id, history_hash)
+        job.job_id = job_id
+        job.status = status
+        job.result = json.loads(result) if result is not None else None
+        return job
+
+    def get(self, job_id: str) -> Optional["AnalysisJob"]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT job_id, session_id, history_hash, status, result, updated_at "
+                "FROM analysis_jobs WHERE job_id = ?", (job_id,)
+            ).fetchone()
+        return self._load(row)
+
+    def find(self, session_id: str, history_hash: str) -> Optional["AnalysisJob"]:
+        """The latest job any worker started for this transcript"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT job_id, session_id, history_hash, status, result, updated_at FROM analysis_jobs "
+                "WHERE session_id = ? AND history_hash = ? ORDER BY updated_at DESC LIMIT 1",
+                (session_id, history_hash)
+            ).fetchone()
+        return self._load(row)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class AnalysisQueue:
+    """Runs analyses in the background, memoized per (session, history hash)"""
+
+    def __init__(self, analyzer: ConversationAnalyzer, max_jobs: int = 1000, store: Optional[SQLiteJobStore] = None):
+        self.analyzer = analyzer
+        self.max_jobs = max_jobs
+        # Optional shared store so a job started by one worker can be polled through any other
+        self.store = store
+        self._jobs: "OrderedDict[str, AnalysisJob]" = OrderedDict()
+        # (session_id, history_hash) -> job, for both finished and in-flight analyses
+        self._by_key: Dict[tuple, AnalysisJob] = {}
+
+    def submit(
+        self,
+        session_id: str,
+        system_role: str,
+        transcript: List[Dict[str, str]],
+        include_suggestions: bool = True
+    ) -> AnalysisJob:
+        """Return the job for this exact transcript and options, starting one if needed"""
+        history_hash = transcript_hash(system_role, transcript, include_suggestions)
+        key = (session_id, history_hash)
+        job = self._by_key.get(key)
+        if job is not None and job.status != "error":
+            return job
+        if self.store is not None:
+            job = self.store.find(session_id, history_hash)
+            if job is not None and job.status != "error":
+                return job
+
+        job = AnalysisJob(session_id, history_hash)
+        # Snapshot the transcript so later turns don't change what is analyzed
+        job.task = asyncio.create_task(self._run(job, system_role, list(transcript), include_suggestions))
+        self._jobs[job.job_id] = job
+        self._by_key[key] = job
+        if self.store is not None:
+            self.store.put(job)
+        self._evict()
+        return job
+
+    async def _run(
+        self,
+        job: AnalysisJob,
+        system_role: str,
+        transcript: List[Dict[str, str]],
+        include_suggestions: bool
+    ):
+        job.status = "running"
+        result = await self.analyzer.analyze(system_role, transcript, include_suggestions)
+        job.result = result
+        job.status = "error" if "error" in result else "done"
+        if self.store is not None:
+            self.store.put(job)
+
+    def get(self, job_id: str) -> Optional[AnalysisJob]:
+        job = self._jobs.get(job_id)
+        if job is None and self.store is not None:
+            job = self.store.get(job_id)
+        return job
+
+    async def wait(self, job: AnalysisJob, poll_interval: float = 0.5) -> AnalysisJob:
+        if job.task is not None:
+            await asyncio.shield(job.task)
+            return job
+        # Started by another worker: follow it through the shared store
+        while job.status not in ("done", "error") and self.store is not None:
+            await asyncio.sleep(poll_interval)
+            latest = self.store.get(job.job_id)
+            if latest is None:
+                job.status = "error"
+                job.result = {"error": "Analysis job was lost; please try again."}
+                break
+            job = latest
+        return job
+
+    def _evict(self):
+        while len(self._jobs) > self.max_jobs:
+            _, job = self._jobs.popitem(last=False)
+            if job.task is not None and not job.task.done():
+                # Never drop a running job; put it back and stop evicting
+                self._jobs[job.job_id] = job
+                self._jobs.move_to_end(job.job_id, last=False)
+                break
+            key = (job.session_id, job.history_hash)
+            if self._by_key.get(key) is job:
+                del self._by_key[key]
+
+
+_analyzer: Optional[ConversationAnalyzer] = None
+
+def get_analyzer() -> ConversationAnalyzer:
+    """Return the process-wide analyzer, sharing its segment cache across sessions"""
+    global _analyzer
+    if _analyzer is None:
+        _analyzer = ConversationAnalyzer(get_engine(), segment_messages=settings.analysis_segment_messages)
+    return _analyzer
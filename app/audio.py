@@ -1,66 +1,235 @@
-import os
-import requests
-import openai
 import io
-import tempfile
+import asyncio
+import contextlib
 import base64
-from typing import Optional, Dict, Any
+import hashlib
+from typing import Optional, Dict, Any, Iterable, AsyncIterator, Tuple, Union, BinaryIO
+
+from app.clients import ClientPool, clients
+from app.metrics import metrics
+from app.singleflight import SingleFlight
+from app.tts_cache import AudioCache
+from app.tts_router import TTSRouter, resolve_voices
+
+def audio_media_type(data: bytes) -> str:
+    """Guess the media type of an audio clip from its leading bytes"""
+    if data[:4] == b"RIFF":
+        return "audio/wav"
+    return "audio/mpeg"
 
 class AudioProcessor:
     """Handles speech recognition and synthesis"""
     
-    def __init__(self, tts_server_url: str = "http://localhost:5000"):
-        self.tts_server_url = tts_server_url
-        self.openai_client = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+    def __init__(
+        self,
+        router: Optional[TTSRouter] = None,
+        client_pool: Optional[ClientPool] = None,
+        cache: Optional[AudioCache] = None,
+        max_upload_bytes: int = 25 * 1024 * 1024,
+        local_voice: str = "af_heart",
+        openai_voice: str = "nova"
+    ):
+        self.client_pool = client_pool or clients
+        self.router = router or TTSRouter(["http://localhost:5000"], self.client_pool)
+        self.local_voice = local_voice
+        self.openai_voice = openai_voice
+        self.cache = cache
+        self.max_upload_bytes = max_upload_bytes
+        # Concurrent identical requests share one upstream call
+        self.tts_flight = SingleFlight("tts")
+        self.stt_flight = SingleFlight("stt")
+    
+    @staticmethod
+    def audio_size(audio: Union[bytes, BinaryIO]) -> int:
+        """Size in bytes of an audio buffer or seekable file object"""
+        if isinstance(audio, (bytes, bytearray)):
+            return len(audio)
+        position = audio.tell()
+        size = audio.seek(0, io.SEEK_END)
+        audio.seek(position)
+        return size
     
-    def speech_to_text(self, audio_data: bytes) -> Dict[str, Any]:
+    @staticmethod
+    def audio_digest(audio: Union[bytes, BinaryIO]) -> str:
+        """Content hash of an audio buffer or seekable file object"""
+        if isinstance(audio, (bytes, bytearray)):
+            return hashlib.sha256(audio).hexdigest()
+        digest = hashlib.sha256()
+        position = audio.tell()
+        for block in iter(lambda: audio.read(64 * 1024), b""):
+            digest.update(block)
+        audio.seek(position)
+        return digest.hexdigest()
+    
+    async def speech_to_text(self, audio: Union[bytes, BinaryIO], filename: str = "audio.wav") -> Dict[str, Any]:
         """Convert speech audio to text using OpenAI's Whisper API"""
         try:
-            # Save audio data to a temporary file
-            with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as temp_file:
-                temp_file_path = temp_file.name
-                temp_file.write(audio_data)
+            if self.audio_size(audio) > self.max_upload_bytes:
+                return {"status": "error", "message": f"Audio exceeds the {self.max_upload_bytes} byte upload limit"}
             
-            # Use OpenAI Whisper for transcription
-            with open(temp_file_path, "rb") as audio_file:
-                transcription = self.openai_client.audio.transcriptions.create(
-                    model="whisper-1", 
-                    file=audio_file
-                )
+            # Hashing a large spooled upload reads it from disk; keep that off the event loop
+            digest = await asyncio.to_thread(self.audio_digest, audio)
             
-            # Clean up
-            os.unlink(temp_file_path)
+            # Hand the buffer or spooled upload straight to Whisper; no temporary file copy
+            with metrics.timer("stt"):
+                transcription = await self.stt_flight.do(
+                    digest,
+                    lambda: self.client_pool.openai.audio.transcriptions.create(
+                        model="whisper-1", 
+                        file=(filename, audio)
+                    )
+                )
             
             return {"status": "success", "text": transcription.text}
             
         except Exception as e:
             return {"status": "error", "message": str(e)}
     
-    def text_to_speech(self, text: str, voice: str = "alloy") -> Dict[str, Any]:
+    def _voices(self, voice: Optional[str]) -> Tuple[str, str, str]:
+        """Resolve a requested voice to (local voice, OpenAI voice, cache voice key)"""
+        local_voice, openai_voice = resolve_voices(voice, self.local_voice, self.openai_voice)
+        return local_voice, openai_voice, f"{local_voice}/{openai_voice}"
+    
+    async def synthesize(self, text: str, voice: str = "default") -> bytes:
+        """Synthesize text to raw audio, serving repeats from the cache"""
+        local_voice, openai_voice, voice_key = self._voices(voice)
+        cache_key = AudioCache.key(text, voice_key, "tts-1")
+        if self.cache:
+            audio_data = await self.cache.get(cache_key)
+            if audio_data is not None:
+                return audio_data
+        
+        return await self.tts_flight.do(
+            cache_key, lambda: self._synthesize_upstream(text, local_voice, openai_voice, cache_key)
+        )
+    
+    @metrics.timed("tts")
+    async def _synthesize_upstream(self, text: str, local_voice: str, openai_voice: str, cache_key: str) -> bytes:
+        """Call the TTS backends and cache the result"""
+        # Try healthy local TTS servers first; backends with an open circuit are skipped without waiting
+        audio_data = None
+        for backend in self.router.candidates():
+            response = await self.router.post(backend, {"text": text, "voice": local_voice})
+            if response is not None:
+                audio_data = response.content
+                break
+        
+        if audio_data is None:
+            # Fallback to OpenAI TTS
+            response = await self.client_pool.openai.audio.speech.create(
+                model="tts-1",
+                voice=openai_voice,
+                input=text
+            )
+            audio_data = response.content
+        
+        if self.cache:
+            await self.cache.put(cache_key, audio_data)
+        return audio_data
+    
+    async def open_speech_stream(self, text: str, voice: str = "default") -> Tuple[str, AsyncIterator[bytes]]:
+        """Start synthesis and return (media_type, chunk iterator) without buffering the clip"""
+        local_voice, openai_voice, voice_key = self._voices(voice)
+        cache_key = AudioCache.key(text, voice_key, "tts-1")
+        if self.cache:
+            audio_data = await self.cache.get(cache_key)
+            if audio_data is not None:
+                async def cached_chunks():
+                    yield audio_data
+                return audio_media_type(audio_data), cached_chunks()
+        
+        # The first caller streams from upstream; concurrent callers for the same clip await its complete result
+        queue: asyncio.Queue = asyncio.Queue()
+        task, leader = self.tts_flight.start(
+            cache_key, lambda: self._stream_upstream(text, local_voice, openai_voice, cache_key, queue)
+        )
+        if not leader:
+            audio_data = await asyncio.shield(task)
+            async def shared_chunks():
+                yield audio_data
+            return audio_media_type(audio_data), shared_chunks()
+        
+        # Only the response headers are awaited here, so a failure of every backend raises before any audio is sent
+        with metrics.timer("tts_first_byte"):
+            media_type = await queue.get()
+        if media_type is None:
+            await asyncio.shield(task)
+        return media_type, self._relay(queue, task)
+    
+    async def _relay(self, queue: asyncio.Queue, task: asyncio.Task) -> AsyncIterator[bytes]:
+        """Yield chunks as the upstream task produces them"""
+        while True:
+            chunk = await queue.get()
+            if chunk is None:
+                break
+            yield chunk
+        # Surface an upstream error that cut the clip short
+        await asyncio.shield(task)
+    
+    async def _stream_upstream(
+        self, text: str, local_voice: str, openai_voice: str, cache_key: str, queue: asyncio.Queue
+    ) -> bytes:
+        """Stream a clip into queue (media type, chunks, then None) and cache it; runs on even if the leader disconnects"""
+        parts = []
+        try:
+            async with contextlib.AsyncExitStack() as stack:
+                media_type, chunks = await self._open_upstream(text, local_voice, openai_voice, stack)
+                queue.put_nowait(media_type)
+                async for chunk in chunks:
+                    parts.append(chunk)
+                    queue.put_nowait(chunk)
+        finally:
+            queue.put_nowait(None)
+        audio_data = b"".join(parts)
+        if self.cache:
+            await self.cache.put(cache_key, audio_data)
+        return audio_data
+    
+    async def _open_upstream(
+        self, text: str, local_voice: str, openai_voice: str, stack: contextlib.AsyncExitStack
+    ) -> Tuple[str, AsyncIterator[bytes]]:
+        """Open a streaming response from the first healthy backend; it is closed with stack"""
+        # Try healthy local TTS servers first
+        for backend in self.router.candidates():
+            response = await self.router.post(backend, {"text": text, "voice": local_voice}, stream=True)
+            if response is not None:
+                stack.push_async_callback(response.aclose)
+                media_type = response.headers.get("content-type", "").split(";")[0]
+                if not media_type.startswith("audio/"):
+                    media_type = "audio/wav"
+                return media_type, response.aiter_bytes()
+        
+        # Fallback to OpenAI TTS
+        response = await stack.enter_async_context(
+            self.client_pool.openai.audio.speech.with_streaming_response.create(
+                model="tts-1",
+                voice=openai_voice,
+                input=text
+            )
+        )
+        return "audio/mpeg", response.iter_bytes()
+    
+    async def warm_up(self, texts: Iterable[str], voice: str = "default", concurrency: int = 4):
+        """Pre-synthesize texts into the cache"""
+        semaphore = asyncio.Semaphore(concurrency)
+        
+        async def synthesize_one(text: str):
+            async with semaphore:
+                try:
+                    await self.synthesize(text, voice)
+                except Exception as e:
+                    print(f"TTS warm-up failed for {text[:40]!r}: {e}")
+        
+        await asyncio.gather(*(synthesize_one(text) for text in set(texts)))
+    
+    async def text_to_speech(self, text: str, voice: str = "default") -> Dict[str, Any]:
         """Convert text to speech using either local TTS server or OpenAI TTS"""
         try:
-            # Try local TTS server first
-            try:
-                response = requests.post(
-                    f"{self.tts_server_url}/synthesize",
-                    json={"text": text, "voice": "af_heart"},
-                    timeout=5
-                )
-                if response.status_code == 200:
-                    audio_data = response.content
-                else:
-                    raise Exception("Local TTS server failed")
-            except:
-                # Fallback to OpenAI TTS
-                response = self.openai_client.audio.speech.create(
-                    model="tts-1",
-                    voice=voice,
-                    input=text
-                )
-                audio_data = response.content
+            audio_data = await self.synthesize(text, voice)
             
             # Convert to base64 for easy transport
-            audio_base64 = base64.b64encode(audio_data).decode("utf-8")
+            with metrics.timer("base64_encode"):
+                audio_base64 = base64.b64encode(audio_data).decode("utf-8")
             
             return {
                 "status": "success", 
@@ -0,0 +1,110 @@
+import os
+import asyncio
+import weakref
+import importlib
+from typing import TYPE_CHECKING, Any, Dict
+
+import httpx
+
+from functions.config import settings
+
+if TYPE_CHECKING:
+    import openai
+
+
+class ClientPool:
+    """Shared keep-alive HTTP and OpenAI clients, created once per event loop"""
+
+    def __init__(self, settings):
+        self.settings = settings
+        # Async clients are bound to the event loop that created them
+        self._loop_clients: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+        self.client_hits = 0
+        self.client_misses = 0
+        self.requests = 0
+        self.connections_opened = 0
+
+    def _limits(self) -> httpx.Limits:
+        return httpx.Limits(
+            max_connections=self.settings.http_max_connections,
+            max_keepalive_connections=self.settings.http_max_keepalive_connections,
+            keepalive_expiry=self.settings.http_keepalive_expiry
+        )
+
+    async def _on_request(self, request: httpx.Request):
+        """Count requests and attach a trace hook that reports new TCP connections"""
+        self.requests += 1
+        request.extensions["trace"] = self._trace
+
+    async def _trace(self, event_name: str, info: Dict[str, Any]):
+        if event_name == "connection.connect_tcp.complete":
+            self.connections_opened += 1
+
+    def _build_http(self) -> httpx.AsyncClient:
+        return httpx.AsyncClient(
+            limits=self._limits(),
+            timeout=self.settings.tts_timeout_seconds,
+            event_hooks={"request": [self._on_request]}
+        )
+
+    def _build_openai(self) -> "openai.AsyncOpenAI":
+        # Imported on first use: the SDK is the largest single share of import time
+        import openai
+        return openai.AsyncOpenAI(
+            api_key=self.settings.openai_api_key or os.getenv("OPENAI_API_KEY"),
+            base_url=self.settings.openai_base_url or None,
+            http_client=openai.DefaultAsyncHttpxClient(
+                limits=self._limits(),
+                event_hooks={"request": [self._on_request]}
+            )
+        )
+
+    def _client(self, name: str, build) -> Any:
+        """Return the named client for the running event loop, building it on first use"""
+        loop = asyncio.get_running_loop()
+        clients = self._loop_clients.get(loop)
+        if clients is None:
+            clients = self._loop_clients[loop] = {}
+        client = clients.get(name)
+        if client is None:
+            self.client_misses += 1
+            client = clients[name] = build()
+        else:
+            self.client_hits += 1
+        return client
+
+    @property
+    def http(self) -> httpx.AsyncClient:
+        """Keep-alive HTTP client for the local TTS server and other plain HTTP calls"""
+        return self._client("http", self._build_http)
+
+    @property
+    def openai(self) -> "openai.AsyncOpenAI":
+        """Keep-alive async OpenAI client"""
+        return self._client("openai", self._build_openai)
+
+    async def startup(self):
+        """Import the OpenAI SDK in a background thread so neither startup nor the first model call waits for it"""
+        asyncio.get_running_loop().run_in_executor(None, importlib.import_module, "openai")
+
+    async def close(self):
+        """Close the clients belonging to the running event loop"""
+        clients = self._loop_clients.pop(asyncio.get_running_loop(), None) or {}
+        if "http" in clients:
+            await clients["http"].aclose()
+        if "openai" in clients:
+            await clients["openai"].close()
+
+    def stats(self) -> Dict[str, int]:
+        """Client reuse and connection pool hit/miss counters"""
+        return {
+            "client_hits": self.client_hits,
+            "client_misses": self.client_misses,
+            "requests": self.requests,
+            "connection_hits": max(self.requests - self.connections_opened, 0),
+            "connection_misses": self.connections_opened
+        }
+
+
+# Process-wide client pool
+clients = ClientPool(settings)
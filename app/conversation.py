@@ -1,50 +1,198 @@
-import os
-import json
-import openai
-from typing import List, Dict, Any, Optional
+import functools
+import contextlib
+from typing import List, Dict, Any, Optional, AsyncIterator
+
+from app.analysis import get_analyzer
+from app.llm import LLMEngine, get_engine, run_sync
+from app.metrics import metrics
+from app.prompts import PromptTable, prompt_table
+from app.response_cache import ResponseCache, get_response_cache
+from functions.config import settings
+
+# Fixed per-message overhead of the chat format, in tokens
+MESSAGE_TOKEN_OVERHEAD = 4
+
+# tiktoken encoding, loaded on first use; False if tiktoken is not installed
+_encoding = None
+
+def count_tokens(text: str) -> int:
+    """Count tokens in text, estimating ~4 characters per token if tiktoken is unavailable"""
+    global _encoding
+    if _encoding is None:
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        except ImportError:  # Fall back to a character-based estimate
+            _encoding = False
+    if _encoding is False:
+        return len(text) // 4 + 1
+    return len(_encoding.encode(text))
+
+@functools.lru_cache(maxsize=None)
+def prompt_tokens(prompt: str) -> int:
+    """Token count for a precompiled system prompt, computed once per prompt"""
+    return count_tokens(prompt) + MESSAGE_TOKEN_OVERHEAD
+
+
+class ConversationHistory:
+    """Full transcript plus a token-budgeted prompt window with a rolling summary of older turns"""
+    
+    SUMMARY_PROMPT = """
+    Summarize the earlier part of this sales role-play conversation so it can replace the original turns.
+    Keep names, numbers, product details, objections raised, offers made and any commitments.
+    If a previous summary is given, merge it with the new turns into a single summary.
+    Reply with the summary only.
+    """
+    
+    def __init__(self, token_budget: int = 3000, keep_recent: int = 6):
+        self.token_budget = token_budget
+        self.keep_recent = keep_recent
+        self.messages: List[Dict[str, str]] = []
+        self.token_counts: List[int] = []
+        # Running summary of messages[1:summarized_upto]
+        self.summary = ""
+        self.summary_tokens = 0
+        self.summarized_upto = 1
+        # Tokens in the prompt window: system message, summary and unsummarized turns
+        self.window_tokens = 0
+    
+    def reset(self, system_message: Dict[str, str], tokens: Optional[int] = None):
+        """Start a new transcript with the given system message"""
+        self.messages = []
+        self.token_counts = []
+        self.summary = ""
+        self.summary_tokens = 0
+        self.summarized_upto = 1
+        self.window_tokens = 0
+        self.append(system_message, tokens)
+    
+    def append(self, message: Dict[str, str], tokens: Optional[int] = None):
+        """Add a message, counting its tokens once"""
+        if tokens is None:
+            tokens = count_tokens(message["content"]) + MESSAGE_TOKEN_OVERHEAD
+        self.messages.append(message)
+        self.token_counts.append(tokens)
+        self.window_tokens += tokens
+    
+    def summary_message(self) -> Dict[str, str]:
+        """The running summary exactly as it is sent to the model"""
+        return {"role": "system", "content": f"SUMMARY OF THE EARLIER CONVERSATION:\n{self.summary}"}
+    
+    def _summary_tokens(self) -> int:
+        if not self.summary:
+            return 0
+        return count_tokens(self.summary_message()["content"]) + MESSAGE_TOKEN_OVERHEAD
+    
+    def prompt_messages(self) -> List[Dict[str, str]]:
+        """Messages to send to the model: system prompt, running summary and recent turns"""
+        prompt = self.messages[:1]
+        if self.summary:
+            prompt.append(self.summary_message())
+        return prompt + self.messages[self.summarized_upto:]
+    
+    def needs_compaction(self) -> bool:
+        return self.window_tokens > self.token_budget
+    
+    async def compact(self, engine: LLMEngine):
+        """Fold the oldest unsummarized turns into the running summary"""
+        # Fold down to half the budget so compaction runs once every several turns, not every turn
+        target = self.token_budget // 2
+        stop = self.summarized_upto
+        window = self.window_tokens
+        last_foldable = len(self.messages) - self.keep_recent
+        while window > target and stop < last_foldable:
+            window -= self.token_counts[stop]
+            stop += 1
+        if stop == self.summarized_upto:
+            return
+        
+        folded = self.messages[self.summarized_upto:stop]
+        transcript = "\n".join(f"{m['role']}: {m['content']}" for m in folded)
+        if self.summary:
+            transcript = f"PREVIOUS SUMMARY:\n{self.summary}\n\nNEW TURNS:\n{transcript}"
+        
+        try:
+            response = await engine.chat(
+                model=settings.openai_model,
+                messages=[
+                    {"role": "system", "content": self.SUMMARY_PROMPT},
+                    {"role": "user", "content": transcript}
+                ],
+                temperature=0.2,
+                max_tokens=settings.summary_max_tokens
+            )
+            summary = response.choices[0].message.content.strip()
+        except Exception:
+            # Keep the window bounded even if the model is unavailable: fall back to a clipped transcript
+            summary = transcript[-settings.summary_max_tokens * 4:]
+        
+        self.window_tokens = window - self.summary_tokens
+        self.summary = summary
+        self.summary_tokens = self._summary_tokens()
+        self.window_tokens += self.summary_tokens
+        self.summarized_upto = stop
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "messages": self.messages,
+            "token_counts": self.token_counts,
+            "summary": self.summary,
+            "summarized_upto": self.summarized_upto
+        }
+    
+    def load(self, data: Dict[str, Any]):
+        """Restore state produced by to_dict"""
+        self.messages = data.get("messages", [])
+        self.token_counts = data.get("token_counts") or [
+            count_tokens(m["content"]) + MESSAGE_TOKEN_OVERHEAD for m in self.messages
+        ]
+        self.summary = data.get("summary", "")
+        self.summary_tokens = self._summary_tokens()
+        self.summarized_upto = data.get("summarized_upto", 1)
+        self.window_tokens = (
+            sum(self.token_counts[:1]) + self.summary_tokens + sum(self.token_counts[self.summarized_upto:])
+        )
+
 
 class ConversationManager:
     """Manages the conversation state and interactions with the AI"""
     
-    def __init__(self):
+    def __init__(
+        self,
+        engine: Optional[LLMEngine] = None,
+        prompts: Optional[PromptTable] = None,
+        response_cache: Optional[ResponseCache] = None
+    ):
+        self.engine = engine or get_engine()
+        self.prompts = prompts or prompt_table
+        self.response_cache = response_cache or get_response_cache()
         self.system_role = ""
         self.assistant_role = ""
         self.scenario = ""
-        self.conversation_history = []
-        
-        self.role_prompts = {
-            "sales specialist": {
-                "product_pitch": "You are a sales SPECIALIST pitching a software solution. Confidently explain product features, demonstrate value, and engage the customer with clear, compelling communication.",
-                "objection_handling": "You are a sales SPECIALIST responding to customer concerns. Listen carefully, address objections directly, and guide the conversation towards a positive resolution.",
-                "negotiation": "You are a sales SPECIALIST negotiating terms. Be strategic, find win-win solutions, and demonstrate the value of your offering.",
-                "upselling": "You are a sales SPECIALIST suggesting premium options. Highlight additional benefits, show how upgrades solve specific customer needs."
-            },
-            "customer": {
-                "product_pitch": "You are a CUSTOMER evaluating a software solution. Ask probing questions, express genuine interest or skepticism, and seek clear value proposition.",
-                "objection_handling": "You are a CUSTOMER raising specific concerns about the product. Be critical but open to hearing solutions.",
-                "negotiation": "You are a CUSTOMER negotiating purchase terms. Focus on your needs, budget constraints, and seek the best possible deal.",
-                "upselling": "You are a CUSTOMER considering product upgrades. Be discerning, ask about specific benefits, and only consider upgrades that provide clear value."
-            }
-        }
-        
-        self.scenario_prompts = {
-            "product_pitch": "The conversation is a product introduction where the sales specialist is presenting a new software solution to a potential customer. The customer is evaluating several options and needs to be convinced of this product's unique value.",
-            "objection_handling": "The conversation follows an initial pitch where the customer has expressed several reservations about moving forward. The sales specialist needs to address these concerns professionally to keep the opportunity alive.",
-            "negotiation": "The conversation is at the final stage where both parties are discussing pricing, terms, and implementation details. This is a critical moment to find an agreement that satisfies both sides.",
-            "upselling": "The conversation is with an existing customer who already uses the basic version of a product. The sales specialist is suggesting premium features or complementary products that could provide additional value."
-        }
-    
+        # Stored revision this state was loaded at; None until a session store has saved it
+        self.version: Optional[int] = None
+        self.history = ConversationHistory(
+            token_budget=settings.context_token_budget,
+            keep_recent=settings.context_keep_recent_messages
+        )
+
     def init_conversation(self, system_role: str, assistant_role: str, scenario: str):
         """Initialize a new conversation with specified roles and scenario"""
-        self.system_role = system_role.lower()
+        system_role = system_role.lower()
+        scenario = scenario.lower()
         
         # If assistant_role is not provided, set it to the opposite of system_role
         if not assistant_role:
-            self.assistant_role = "customer" if system_role == "sales specialist" else "sales specialist"
+            assistant_role = self.prompts.counterpart(system_role)
         else:
-            self.assistant_role = assistant_role.lower()
-            
-        self.scenario = scenario.lower()
+            assistant_role = assistant_role.lower()
+        
+        # Reject unknown roles or scenarios before touching any state
+        self.prompts.validate(assistant_role, system_role, scenario)
+        
+        self.system_role = system_role
+        self.assistant_role = assistant_role
+        self.scenario = scenario
         self.update_system_message()
         
         return {
@@ -53,36 +201,47 @@ class ConversationManager:
             "scenario": self.scenario
         }
     
+    def to_dict(self) -> Dict[str, Any]:
+        """Serialize the conversation state for a session store"""
+        return {
+            "system_role": self.system_role,
+            "assistant_role": self.assistant_role,
+            "scenario": self.scenario,
+            "history": self.history.to_dict()
+        }
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ConversationManager":
+        """Rebuild a conversation manager from serialized state"""
+        manager = cls()
+        manager.system_role = data.get("system_role", "")
+        manager.assistant_role = data.get("assistant_role", "")
+        manager.scenario = data.get("scenario", "")
+        if "history" in data:
+            manager.history.load(data["history"])
+        else:
+            manager.history.load({"messages": data.get("conversation_history", [])})
+        return manager
+    
+    @property
+    def conversation_history(self) -> List[Dict[str, str]]:
+        """Full transcript, including turns already folded into the summary"""
+        return self.history.messages
+    
     def get_role_guidance(self) -> str:
         """Get role-specific guidance for the current scenario"""
         if not self.system_role or not self.scenario:
             return "Please start a conversation first."
         
-        return self.role_prompts[self.system_role][self.scenario]
+        return self.prompts.guidance(self.system_role, self.scenario)
     
     def update_system_message(self):
         """Update the system message in the conversation history"""
-        system_prompt = f"""
-        ROLE CONFIGURATION:
-        - YOU ARE: {self.assistant_role.upper()}
-        - CONVERSATION PARTNER IS: {self.system_role.upper()}
-
-        SCENARIO: {self.scenario_prompts[self.scenario]}
-
-        ROLE-SPECIFIC INSTRUCTIONS:
-        {self.role_prompts[self.assistant_role][self.scenario]}
-
-        CRITICAL INSTRUCTIONS:
-        1. Always maintain the assigned role of {self.assistant_role.upper()}
-        2. Respond consistently within the context of the {self.scenario.replace('_', ' ')} scenario
-        3. Do not switch or question your role during the conversation
-        4. Engage naturally and contextually with your conversation partner
-
-        Respond directly and stay true to your assigned role as the {self.assistant_role.upper()}.
-        """
+        # Precompiled and interned, so this is a table lookup rather than a rebuild
+        system_prompt = self.prompts.system_prompt(self.assistant_role, self.system_role, self.scenario)
         
         # Reset conversation history with the clear system message
-        self.conversation_history = [{"role": "system", "content": system_prompt}]
+        self.history.reset({"role": "system", "content": system_prompt}, prompt_tokens(system_prompt))
     
     def switch_roles(self):
         """Switch the roles between system and assistant"""
@@ -96,7 +255,7 @@ class ConversationManager:
     
     def switch_scenario(self, new_scenario: str):
         """Switch to a different conversation scenario"""
-        if new_scenario.lower() in self.scenario_prompts:
+        if new_scenario.lower() in self.prompts.scenario_prompts:
             self.scenario = new_scenario.lower()
             self.update_system_message()
             return True
@@ -106,74 +265,103 @@ class ConversationManager:
         """Reset the current conversation while maintaining roles and scenario"""
         self.update_system_message()
     
+    def _response_params(self) -> Dict[str, Any]:
+        """Model parameters for the next assistant turn"""
+        return {
+            "model": settings.openai_model,
+            "messages": self.history.prompt_messages(),
+            "temperature": 0.5,
+            "max_tokens": 500,
+            "stop": [f"You ({self.system_role}):", f"You ({self.assistant_role}):"]
+        }
+    
     def get_ai_response(self, user_message: str) -> str:
+        """Get AI response for the user message (synchronous wrapper)"""
+        return run_sync(self.get_ai_response_async(user_message))
+    
+    async def get_ai_response_async(self, user_message: str) -> str:
         """Get AI response for the user message"""
         # Add user message to conversation history
-        self.conversation_history.append({"role": "user", "content": user_message})
+        self.history.append({"role": "user", "content": user_message})
+        if self.history.needs_compaction():
+            with metrics.timer("compaction"):
+                await self.history.compact(self.engine)
+        
+        with metrics.timer("prompt_build"):
+            params = self._response_params()
+            cache_key = self.response_cache.key(params) if self.response_cache else None
+        if cache_key:
+            response_text = self.response_cache.get(cache_key)
+            if response_text is not None:
+                self.history.append({"role": "assistant", "content": response_text})
+                return response_text
         
         try:
             # Get response from OpenAI
-            client = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-            response = client.chat.completions.create(
-                model="gpt-4-turbo",
-                messages=self.conversation_history,
-                temperature=0.5,
-                max_tokens=500,
-                stop=[f"You ({self.system_role}):", f"You ({self.assistant_role}):"]
-            )
+            response = await self.engine.chat(**params)
             
             # Extract and process response
             response_text = response.choices[0].message.content
             
             # Add AI response to conversation history
-            self.conversation_history.append({"role": "assistant", "content": response_text})
+            self.history.append({"role": "assistant", "content": response_text})
+            if cache_key:
+                self.response_cache.put(cache_key, response_text)
             
             return response_text
             
         except Exception as e:
             error_message = f"Error: Unable to get AI response. Details: {str(e)}"
             # Add error message to conversation history to maintain context
-            self.conversation_history.append({"role": "assistant", "content": error_message})
+            self.history.append({"role": "assistant", "content": error_message})
             return error_message
     
-    def analyze_conversation(self) -> Dict[str, Any]:
-        """Analyze the conversation and provide feedback"""
-        if len(self.conversation_history) <= 1:
-            return {"error": "Not enough conversation history to analyze."}
+    async def stream_ai_response(self, user_message: str) -> AsyncIterator[str]:
+        """Stream the AI response as text deltas; the assembled reply is added to the history"""
+        self.history.append({"role": "user", "content": user_message})
+        if self.history.needs_compaction():
+            with metrics.timer("compaction"):
+                await self.history.compact(self.engine)
         
-        analysis_prompt = {
-            "role": "system",
-            "content": """
-            Analyze the conversation between the sales specialist and customer for:
-            - Strengths: What communication techniques worked well
-            - Weaknesses: Areas where communication could be improved
-            - Key moments: Critical turning points in the conversation
-            - Improvement suggestions: Specific, actionable tips for more effective communication
-            - Role-specific feedback: Tailored advice based on whether the user was acting as the sales specialist or customer
-            
-            Return the response as JSON with these categories as keys.
-            """
-        }
-
-        analysis_messages = [analysis_prompt] + self.conversation_history[1:]
+        with metrics.timer("prompt_build"):
+            params = self._response_params()
+            cache_key = self.response_cache.key(params) if self.response_cache else None
+        if cache_key:
+            response_text = self.response_cache.get(cache_key)
+            if response_text is not None:
+                self.history.append({"role": "assistant", "content": response_text})
+                yield response_text
+                return
         
+        parts = []
+        response_text = None
         try:
-            # Get analysis from OpenAI
-            client = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-            response = client.chat.completions.create(
-                model="gpt-4-turbo",
-                messages=analysis_messages,
-                temperature=0.3,
-                max_tokens=1000
-            )
-            
-            # Parse and return feedback
-            try:
-                feedback = json.loads(response.choices[0].message.content)
-                return feedback
-            except json.JSONDecodeError:
-                # Handle case where response isn't valid JSON
-                return {"error": "Unable to parse analysis response as JSON."}
-                
+            async with contextlib.aclosing(self.engine.stream_chat(**params)) as deltas:
+                async for delta in deltas:
+                    parts.append(delta)
+                    yield delta
+            response_text = "".join(parts)
+            if cache_key:
+                self.response_cache.put(cache_key, response_text)
         except Exception as e:
-            return {"error": f"Unable to analyze conversation. Details: {str(e)}"}
\ No newline at end of file
+            error_message = f"Error: Unable to get AI response. Details: {str(e)}"
+            # Keep whatever was already streamed so the history matches what the user saw
+            response_text = "".join(parts) + ("\n" if parts else "") + error_message
+            yield ("\n" if parts else "") + error_message
+        finally:
+            # Also runs when the client disconnects mid-stream (GeneratorExit or cancellation)
+            if response_text is None:
+                response_text = "".join(parts)
+            self.history.append({"role": "assistant", "content": response_text})
+    
+    def analyze_conversation(self, include_suggestions: bool = True) -> Dict[str, Any]:
+        """Analyze the conversation and provide feedback (synchronous wrapper)"""
+        return run_sync(self.analyze_conversation_async(include_suggestions))
+    
+    async def analyze_conversation_async(self, include_suggestions: bool = True) -> Dict[str, Any]:
+        """Analyze the conversation and provide feedback"""
+        if len(self.conversation_history) <= 1:
+            return {"error": "Not enough conversation history to analyze."}
+        
+        # The analyzer sees the full transcript, not the summarized prompt window
+        return await get_analyzer().analyze(self.system_role, self.conversation_history[1:], include_suggestions)
\ No newline at end of file
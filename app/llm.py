@@ -0,0 +1,116 @@
+import json
+import asyncio
+import hashlib
+import weakref
+from typing import Any, AsyncIterator, Coroutine, Optional
+
+from app.clients import ClientPool, clients
+from app.metrics import metrics
+from app.singleflight import SingleFlight
+from functions.config import settings
+
+
+class LLMTimeoutError(Exception):
+    """Raised when an upstream model call exceeds its deadline"""
+
+
+class LLMEngine:
+    """Async chat-completion client with a concurrency limit and per-request timeout"""
+
+    def __init__(
+        self,
+        client_pool: ClientPool,
+        max_concurrency: int = 32,
+        timeout: float = 60.0
+    ):
+        self.client_pool = client_pool
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        # Semaphores are bound to the event loop that created them
+        self._semaphores: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+        # Identical concurrent requests share one upstream call
+        self.flight = SingleFlight("chat")
+
+    def _state(self):
+        """Return the (client, semaphore) pair for the running event loop"""
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphores.get(loop)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._semaphores[loop] = semaphore
+        return self.client_pool.openai, semaphore
+
+    async def chat(self, timeout: Optional[float] = None, **params: Any):
+        """Run a chat completion, coalescing identical in-flight requests"""
+        key = hashlib.sha256(json.dumps(params, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+        return await self.flight.do(key, lambda: self._chat(timeout, **params))
+    
+    async def _chat(self, timeout: Optional[float] = None, **params: Any):
+        """Run a chat completion, waiting for a free slot and enforcing the deadline"""
+        client, semaphore = self._state()
+        deadline = timeout or self.timeout
+        async with semaphore:
+            try:
+                with metrics.timer("llm"):
+                    response = await asyncio.wait_for(client.chat.completions.create(**params), deadline)
+            except asyncio.TimeoutError:
+                raise LLMTimeoutError(f"Model call timed out after {deadline:g}s")
+        metrics.record_usage(params.get("model", ""), getattr(response, "usage", None))
+        return response
+
+    async def stream_chat(self, timeout: Optional[float] = None, **params: Any) -> AsyncIterator[str]:
+        """Stream a chat completion, yielding text deltas as they arrive"""
+        client, semaphore = self._state()
+        deadline = timeout or self.timeout
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        expires_at = started + deadline
+        first_token = True
+        async with semaphore:
+            try:
+                # Ask for a final usage chunk so streamed replies are counted too
+                stream = await asyncio.wait_for(
+                    client.chat.completions.create(stream=True, stream_options={"include_usage": True}, **params),
+                    deadline
+                )
+                chunks = stream.__aiter__()
+                while True:
+                    try:
+                        chunk = await asyncio.wait_for(chunks.__anext__(), expires_at - loop.time())
+                    except StopAsyncIteration:
+                        break
+                    if getattr(chunk, "usage", None):
+                        metrics.record_usage(params.get("model", ""), chunk.usage)
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        if first_token:
+                            metrics.observe("llm_first_token", loop.time() - started)
+                            first_token = False
+                        yield chunk.choices[0].delta.content
+            except asyncio.TimeoutError:
+                raise LLMTimeoutError(f"Model call timed out after {deadline:g}s")
+            finally:
+                metrics.observe("llm_stream", loop.time() - started)
+
+
+def run_sync(coro: Coroutine) -> Any:
+    """Run a coroutine from synchronous code; not usable inside a running event loop"""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+    coro.close()
+    raise RuntimeError("Synchronous wrapper called from a running event loop; await the async method instead")
+
+
+_engine: Optional[LLMEngine] = None
+
+def get_engine() -> LLMEngine:
+    """Return the process-wide engine, creating it from settings on first use"""
+    global _engine
+    if _engine is None:
+        _engine = LLMEngine(
+            clients,
+            max_concurrency=settings.llm_max_concurrency,
+            timeout=settings.llm_timeout_seconds
+        )
+    return _engine
@@ -1,56 +1,233 @@
-import os
+import time
+_import_started = time.perf_counter()
+
 import json
-from fastapi import FastAPI, Request, WebSocket, WebSocketDisconnect, Form, UploadFile, File
-from fastapi.responses import HTMLResponse, JSONResponse
-from fastapi.staticfiles import StaticFiles
+import asyncio
+import contextlib
+import weakref
+from typing import Optional
+from fastapi import FastAPI, Request, WebSocket, WebSocketDisconnect, Form, UploadFile, File, Depends, Header
+from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.templating import Jinja2Templates
-from pydantic import BaseModel
-import openai
-from dotenv import load_dotenv
-import uvicorn
 import base64
-import requests
-from io import BytesIO
 
 from app.models import ConversationRequest, SpeechRequest, Message, FeedbackRequest
 from app.conversation import ConversationManager
+from app.audio import AudioProcessor, audio_media_type
+from app.analysis import AnalysisQueue, SQLiteJobStore, get_analyzer
+from app.clients import clients
+from app.tts_cache import AudioCache
+from app.tts_router import TTSRouter
+from app.prompts import InvalidConversationConfig, prompt_table
+from app.llm import get_engine
+from app.metrics import TimedRoute, TimingMiddleware, flatten_stats, metrics
+from app.response_cache import get_response_cache
+from app.sessions import SessionConflict, create_session_store
+from app.static_assets import FingerprintedStaticFiles
+from app.upload_limit import UploadLimitMiddleware, UploadTooLarge, upload_too_large_response
+from app.voice import EnergyVAD, create_transcriber, split_sentences
 from functions.config import settings
 
-# Load environment variables
-load_dotenv()
-
-# Initialize OpenAI client
-openai.api_key = os.getenv("OPENAI_API_KEY")
-if not openai.api_key:
-    raise ValueError("OPENAI_API_KEY not found in environment variables")
-
+# Environment variables are loaded by functions.config; a missing key is reported at startup
 app = FastAPI(title="Sales Conversation Training Assistant")
 
-# Mount static files
-app.mount("/static", StaticFiles(directory="static"), name="static")
+# Per-stage latency histograms for /metrics, with an optional Server-Timing header
+app.router.route_class = TimedRoute
+# Oversized audio is refused before Starlette parses and spools the multipart body
+app.add_middleware(UploadLimitMiddleware, max_bytes=settings.stt_max_upload_bytes, paths=["/api/speech-to-text"])
+app.add_middleware(TimingMiddleware, metrics=metrics, server_timing=settings.server_timing_enabled)
+
+# Mount static files; templates link them through content-hashed, long-cached URLs
+static_files = FingerprintedStaticFiles(directory="static", url_prefix="/static")
+app.mount("/static", static_files, name="static")
 templates = Jinja2Templates(directory="templates")
+templates.env.globals["asset_url"] = static_files.url
+
+# Session-keyed conversation state
+session_store = create_session_store(settings)
+
+class SessionNotFound(Exception):
+    """Raised when a request carries an unknown or expired session ID"""
+
+@app.exception_handler(SessionNotFound)
+async def session_not_found_handler(request: Request, exc: SessionNotFound):
+    return JSONResponse(
+        status_code=404,
+        content={"status": "error", "message": "Session not found or expired. Please start a new conversation."}
+    )
+
+# Another request (usually in another worker) saved a turn on this session while this one ran
+SESSION_CONFLICT_MESSAGE = "The conversation was changed by another request. Please send your message again."
+
+@app.exception_handler(SessionConflict)
+async def session_conflict_handler(request: Request, exc: SessionConflict):
+    return JSONResponse(status_code=409, content={"status": "error", "message": SESSION_CONFLICT_MESSAGE})
+
+# Per-session locks, so HTTP, /ws and voice turns on one session never interleave in this worker
+_session_locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+def session_lock(session_id: str) -> asyncio.Lock:
+    """Lock held for the whole of a conversation turn on a session"""
+    lock = _session_locks.get(session_id)
+    if lock is None:
+        lock = _session_locks[session_id] = asyncio.Lock()
+    return lock
+
+def save_session(session_id: str, conversation_manager: ConversationManager) -> bool:
+    """Save a session from a streaming handler; False if a concurrent write won"""
+    try:
+        session_store.save(session_id, conversation_manager)
+    except SessionConflict:
+        return False
+    return True
+
+def get_session_id(
+    x_session_id: Optional[str] = Header(None),
+    session_id: Optional[str] = None
+) -> Optional[str]:
+    """Read the session ID from the X-Session-ID header or the session_id query parameter"""
+    return x_session_id or session_id
+
+def get_conversation(session_id: Optional[str] = Depends(get_session_id)) -> ConversationManager:
+    """Resolve the conversation manager for the current session"""
+    conversation_manager = session_store.get(session_id) if session_id else None
+    if conversation_manager is None:
+        raise SessionNotFound()
+    return conversation_manager
+
+# Speech processing shares the pooled clients and a two-tier audio cache
+tts_cache = AudioCache(
+    directory=settings.tts_cache_dir,
+    memory_max_bytes=settings.tts_cache_memory_bytes,
+    disk_max_bytes=settings.tts_cache_disk_bytes
+)
+# Local TTS servers are picked by health and latency; OpenAI is the fallback
+tts_router = TTSRouter(
+    [url.strip() for url in settings.tts_server_urls.split(",") if url.strip()],
+    clients,
+    failure_threshold=settings.tts_failure_threshold,
+    reset_seconds=settings.tts_circuit_reset_seconds,
+    probe_interval=settings.tts_probe_interval_seconds,
+    timeout=settings.tts_timeout_seconds
+)
+audio_processor = AudioProcessor(
+    tts_router,
+    clients,
+    tts_cache,
+    max_upload_bytes=settings.stt_max_upload_bytes,
+    local_voice=settings.tts_local_voice,
+    openai_voice=settings.tts_openai_voice
+)
+
+# Transcribes utterances cut by the /ws voice mode
+transcriber = create_transcriber(settings)
+
+# Background conversation analysis, memoized per (session, transcript); with the sqlite backend
+# job status is shared so any worker can answer a poll
+analysis_queue = AnalysisQueue(
+    get_analyzer(),
+    store=SQLiteJobStore(
+        settings.session_db_path,
+        ttl_seconds=settings.session_ttl_seconds,
+        busy_timeout=settings.sqlite_busy_timeout_seconds
+    ) if settings.session_backend == "sqlite" else None
+)
+
+@app.on_event("startup")
+async def start_clients():
+    await clients.startup()
 
-# Initialize conversation manager
-conversation_manager = ConversationManager()
+@app.on_event("startup")
+async def start_tts_probes():
+    tts_router.start()
+
+# Background TTS warm-up; held here so it is not garbage-collected mid-run and can be cancelled at shutdown
+tts_warm_up_task: Optional[asyncio.Task] = None
+
+@app.on_event("startup")
+async def warm_up_tts_cache():
+    """Pre-synthesize every role guidance and scenario text in the background"""
+    global tts_warm_up_task
+    if not settings.tts_warmup:
+        return
+    texts = [text for by_scenario in prompt_table.role_prompts.values() for text in by_scenario.values()]
+    texts += list(prompt_table.scenario_prompts.values())
+    tts_warm_up_task = asyncio.create_task(audio_processor.warm_up(texts))
+
+@app.on_event("shutdown")
+async def stop_tts_warm_up():
+    """Cancel an unfinished warm-up before the clients it uses are closed"""
+    if tts_warm_up_task is not None and not tts_warm_up_task.done():
+        tts_warm_up_task.cancel()
+        try:
+            await tts_warm_up_task
+        except asyncio.CancelledError:
+            pass
+
+# Seconds from the start of importing this module, filled in as startup progresses
+startup_timings = {"import": time.perf_counter() - _import_started}
+
+@app.on_event("startup")
+async def report_startup():
+    """Runs after the other startup hooks; prints how long the process took to become ready"""
+    startup_timings["ready"] = time.perf_counter() - _import_started
+    print(f"Startup: app.main imported in {startup_timings['import']:.2f}s, ready after {startup_timings['ready']:.2f}s")
+    if not settings.openai_api_key:
+        print("Warning: OPENAI_API_KEY is not set; model, speech-to-text and OpenAI TTS calls will fail")
+
+@app.on_event("shutdown")
+async def close_clients():
+    await tts_router.stop()
+    await clients.close()
+
+@app.on_event("shutdown")
+async def close_session_store():
+    session_store.close()
+    if analysis_queue.store is not None:
+        analysis_queue.store.close()
+
+@app.on_event("shutdown")
+async def close_response_cache():
+    response_cache = get_response_cache()
+    if response_cache:
+        response_cache.close()
+
+@app.exception_handler(UploadTooLarge)
+async def upload_too_large_handler(request: Request, exc: UploadTooLarge):
+    return upload_too_large_response(exc)
+
+@app.exception_handler(InvalidConversationConfig)
+async def invalid_config_handler(request: Request, exc: InvalidConversationConfig):
+    return JSONResponse(status_code=400, content={"status": "error", "message": str(exc)})
 
 @app.get("/", response_class=HTMLResponse)
 async def get_home(request: Request):
     """Render the main application page"""
-    return templates.TemplateResponse("index.html", {"request": request})
+    return templates.TemplateResponse(request, "index.html")
 
 @app.post("/api/start-conversation")
-async def start_conversation(request: ConversationRequest):
+async def start_conversation(
+    request: ConversationRequest,
+    session_id: Optional[str] = Depends(get_session_id)
+):
     """Initialize a new conversation with specified roles and scenario"""
+    # Reuse the caller's session if it is still alive, otherwise issue a new one
+    conversation_manager = session_store.get(session_id) if session_id else None
+    if conversation_manager is None:
+        session_id, conversation_manager = session_store.new_session_id(), ConversationManager()
+    
     conversation_manager.init_conversation(
         system_role=request.system_role,
         assistant_role=request.assistant_role,
         scenario=request.scenario
     )
+    session_store.save(session_id, conversation_manager)
     
     role_guidance = conversation_manager.get_role_guidance()
     
     return {
         "status": "success",
+        "session_id": session_id,
         "system_role": request.system_role,
         "assistant_role": request.assistant_role,
         "scenario": request.scenario,
@@ -58,9 +235,16 @@ async def start_conversation(request: ConversationRequest):
     }
 
 @app.post("/api/send-message")
-async def process_message(message: Message):
+async def process_message(
+    message: Message,
+    session_id: Optional[str] = Depends(get_session_id)
+):
     """Process a user message and get AI response"""
-    ai_response = conversation_manager.get_ai_response(message.content)
+    # One turn at a time per session; the session is read under the lock so it includes the previous turn
+    async with session_lock(session_id):
+        conversation_manager = get_conversation(session_id)
+        ai_response = await conversation_manager.get_ai_response_async(message.content)
+        session_store.save(session_id, conversation_manager)
     return {
         "status": "success",
         "response": ai_response,
@@ -68,10 +252,53 @@ async def process_message(message: Message):
         "assistant_role": conversation_manager.assistant_role
     }
 
+# The dependency answers 404 for an unknown session before the stream starts
+@app.post("/api/send-message/stream", dependencies=[Depends(get_conversation)])
+async def process_message_stream(
+    message: Message,
+    session_id: Optional[str] = Depends(get_session_id)
+):
+    """Process a user message and stream the AI response as server-sent events"""
+    async def event_stream():
+        # Hold the session's turn lock while streaming and saving; re-read the session under it
+        async with session_lock(session_id):
+            manager = session_store.get(session_id)
+            if manager is None:
+                yield f"event: error\ndata: {json.dumps({'message': 'Session not found or expired.'})}\n\n"
+                return
+            parts = []
+            try:
+                async with contextlib.aclosing(manager.stream_ai_response(message.content)) as deltas:
+                    async for delta in deltas:
+                        parts.append(delta)
+                        yield f"event: delta\ndata: {json.dumps({'content': delta})}\n\n"
+            finally:
+                # Save even if the client went away; the partial reply is already in the history
+                saved = save_session(session_id, manager)
+        if not saved:
+            yield f"event: error\ndata: {json.dumps({'message': SESSION_CONFLICT_MESSAGE})}\n\n"
+            return
+        done = {
+            "response": "".join(parts),
+            "system_role": manager.system_role,
+            "assistant_role": manager.assistant_role
+        }
+        yield f"event: done\ndata: {json.dumps(done)}\n\n"
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.post("/api/switch-roles")
-async def switch_roles():
+async def switch_roles(
+    session_id: Optional[str] = Depends(get_session_id),
+    conversation_manager: ConversationManager = Depends(get_conversation)
+):
     """Switch the roles between system and assistant"""
     conversation_manager.switch_roles()
+    session_store.save(session_id, conversation_manager)
     role_guidance = conversation_manager.get_role_guidance()
     
     return {
@@ -82,9 +309,18 @@ async def switch_roles():
     }
 
 @app.post("/api/switch-scenario")
-async def switch_scenario(request: ConversationRequest):
+async def switch_scenario(
+    request: ConversationRequest,
+    session_id: Optional[str] = Depends(get_session_id),
+    conversation_manager: ConversationManager = Depends(get_conversation)
+):
     """Switch to a different conversation scenario"""
-    conversation_manager.switch_scenario(request.scenario)
+    if not conversation_manager.switch_scenario(request.scenario):
+        return JSONResponse(
+            status_code=400,
+            content={"status": "error", "message": f"Unknown scenario '{request.scenario}'"}
+        )
+    session_store.save(session_id, conversation_manager)
     role_guidance = conversation_manager.get_role_guidance()
     
     return {
@@ -94,104 +330,363 @@ async def switch_scenario(request: ConversationRequest):
     }
 
 @app.post("/api/reset-conversation")
-async def reset_conversation():
+async def reset_conversation(
+    session_id: Optional[str] = Depends(get_session_id),
+    conversation_manager: ConversationManager = Depends(get_conversation)
+):
     """Reset the current conversation"""
     conversation_manager.reset_conversation()
+    session_store.save(session_id, conversation_manager)
     return {"status": "success"}
 
 @app.post("/api/analyze-conversation")
-async def analyze_conversation(request: FeedbackRequest):
-    """Analyze the conversation and provide feedback"""
-    feedback = conversation_manager.analyze_conversation()
-    return {
-        "status": "success",
-        "feedback": feedback
-    }
+async def analyze_conversation(
+    request: FeedbackRequest,
+    session_id: Optional[str] = Depends(get_session_id),
+    conversation_manager: ConversationManager = Depends(get_conversation)
+):
+    """Start a background analysis; returns the feedback at once if this transcript was already analyzed"""
+    if len(conversation_manager.conversation_history) <= 1:
+        return {"status": "error", "message": "Not enough conversation history to analyze."}
+    
+    job = analysis_queue.submit(
+        session_id,
+        conversation_manager.system_role,
+        conversation_manager.conversation_history[1:],
+        request.include_suggestions is not False
+    )
+    return JSONResponse(status_code=200 if job.status in ("done", "error") else 202, content=job.to_dict())
+
+@app.get("/api/analysis/{job_id}")
+async def get_analysis(job_id: str, session_id: Optional[str] = Depends(get_session_id)):
+    """Poll a background analysis job"""
+    job = analysis_queue.get(job_id)
+    if job is None or job.session_id != session_id:
+        return JSONResponse(status_code=404, content={"status": "error", "message": "Analysis job not found."})
+    return job.to_dict()
 
 @app.post("/api/text-to-speech")
 async def text_to_speech(request: SpeechRequest):
     """Convert text to speech audio with female voice"""
     try:
-        # Try using local TTS server if available
-        try:
-            url = 'http://localhost:5000/synthesize'
-            # Explicitly set voice to af_heart (female voice)
-            data = {'text': request.text, 'voice': "af_heart"}
-            response = requests.post(url, json=data, timeout=5)
-            audio_data = response.content
-        except:
-            # Fallback to OpenAI TTS with a female voice
-            response = openai.audio.speech.create(
-                model="tts-1",
-                voice="nova",  # Using 'nova' as it's a female voice
-                input=request.text
-            )
-            audio_data = response.content
+        # Healthy local TTS server with OpenAI fallback; repeats come from the cache
+        audio_data = await audio_processor.synthesize(request.text, request.voice)
         
         # Convert audio data to base64 for sending to client
-        base64_audio = base64.b64encode(audio_data).decode('utf-8')
+        with metrics.timer("base64_encode"):
+            base64_audio = base64.b64encode(audio_data).decode('utf-8')
         return {"status": "success", "audio": base64_audio}
     
     except Exception as e:
         return {"status": "error", "message": str(e)}
     
+async def speech_stream_response(text: str, voice: str = "default"):
+    """Relay synthesized audio to the client as a chunked binary response"""
+    try:
+        media_type, chunks = await audio_processor.open_speech_stream(text, voice)
+    except Exception as e:
+        # Every backend failed before any audio was sent; report it instead of an empty 200
+        return JSONResponse(status_code=502, content={"status": "error", "message": f"Text-to-speech failed: {e}"})
+    return StreamingResponse(chunks, media_type=media_type)
+
+@app.get("/api/text-to-speech/stream")
+async def text_to_speech_stream(text: str, voice: str = "default"):
+    """Stream speech audio as binary; usable directly as an <audio> source"""
+    return await speech_stream_response(text, voice)
+
+@app.post("/api/text-to-speech/stream")
+async def text_to_speech_stream_post(request: SpeechRequest):
+    """Stream speech audio as binary for a JSON request body"""
+    return await speech_stream_response(request.text, request.voice)
+
 @app.post("/api/speech-to-text")
 async def speech_to_text(file: UploadFile = File(...)):
     """Convert speech audio to text"""
-    try:
-        # Read audio file
-        audio_data = await file.read()
+    # The middleware capped the raw body; this is the exact limit on the audio file itself
+    if (file.size or 0) > settings.stt_max_upload_bytes:
+        return JSONResponse(
+            status_code=413,
+            content={"status": "error", "message": f"Audio exceeds the {settings.stt_max_upload_bytes} byte upload limit"}
+        )
+    
+    # Transcribe straight from the spooled upload
+    return await audio_processor.speech_to_text(file.file, file.filename or "audio.wav")
+
+
+@app.get("/api/client-stats")
+async def client_stats():
+    """Report shared client and connection pool hit/miss counters"""
+    return {"status": "success", "clients": clients.stats()}
+
+@app.get("/api/tts-backends")
+async def tts_backends():
+    """Report circuit state and smoothed latency of each local TTS server"""
+    return {"status": "success", "backends": tts_router.stats()}
+
+@app.get("/api/cache-stats")
+async def cache_stats():
+    """Report cache hit/miss counters and sizes"""
+    response_cache = get_response_cache()
+    return {
+        "status": "success",
+        "tts_cache": tts_cache.stats(),
+        "response_cache": response_cache.stats() if response_cache else None,
+        "coalescing": {
+            "chat": get_engine().flight.stats(),
+            "tts": audio_processor.tts_flight.stats(),
+            "stt": audio_processor.stt_flight.stats()
+        }
+    }
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Expose stage latencies, token counts, sessions and cache counters in Prometheus text format"""
+    response_cache = get_response_cache()
+    gauges = {"active_sessions": len(session_store)}
+    gauges.update(flatten_stats("startup_seconds", startup_timings))
+    gauges.update(flatten_stats("tts_cache", tts_cache.stats()))
+    if response_cache:
+        gauges.update(flatten_stats("response_cache", response_cache.stats()))
+    gauges.update(flatten_stats("clients", clients.stats()))
+    for name, flight in (
+        ("chat", get_engine().flight),
+        ("tts", audio_processor.tts_flight),
+        ("stt", audio_processor.stt_flight)
+    ):
+        gauges.update(flatten_stats(f"coalescing_{name}", flight.stats()))
+    return PlainTextResponse(metrics.render(gauges), media_type="text/plain; version=0.0.4")
+
+async def voice_turn(websocket: WebSocket, session_id: str, pcm: bytes, sample_rate: int):
+    """Transcribe an utterance, stream the reply and speak it sentence by sentence"""
+    with metrics.timer("stt"):
+        text = (await transcriber.transcribe(pcm, sample_rate)).strip()
+    if not text:
+        return
+    await websocket.send_json({"type": "transcript", "content": text})
+    
+    # Typed /ws turns on this session wait until this turn is saved and spoken
+    async with session_lock(session_id):
+        conversation_manager = session_store.get(session_id)
+        if conversation_manager is None:
+            await websocket.send_json({"type": "error", "message": "Session not found or expired."})
+            return
         
-        # Use OpenAI's Whisper API for transcription
-        with open("temp_audio.wav", "wb") as f:
-            f.write(audio_data)
+        # Sentences are synthesized concurrently with generation but sent in order
+        audio_queue: asyncio.Queue = asyncio.Queue()
         
-        with open("temp_audio.wav", "rb") as f:
-            transcription = openai.audio.transcriptions.create(
-                model="whisper-1",
-                file=f
-            )
+        async def send_audio():
+            while True:
+                synthesis = await audio_queue.get()
+                if synthesis is None:
+                    return
+                try:
+                    audio_data = await synthesis
+                except Exception as e:
+                    await websocket.send_json({"type": "error", "message": f"Text-to-speech failed: {e}"})
+                    continue
+                await websocket.send_json({"type": "audio_start", "media_type": audio_media_type(audio_data)})
+                await websocket.send_bytes(audio_data)
+                await websocket.send_json({"type": "audio_end"})
         
-        # Clean up temp file
-        os.remove("temp_audio.wav")
+        def speak(sentence: str):
+            audio_queue.put_nowait(asyncio.create_task(audio_processor.synthesize(sentence)))
         
-        return {"status": "success", "text": transcription.text}
-    
-    except Exception as e:
-        return {"status": "error", "message": str(e)}
+        sender = asyncio.create_task(send_audio())
+        try:
+            parts = []
+            unfinished = ""
+            try:
+                async with contextlib.aclosing(conversation_manager.stream_ai_response(text)) as deltas:
+                    async for delta in deltas:
+                        parts.append(delta)
+                        await websocket.send_json({"type": "delta", "content": delta})
+                        sentences, unfinished = split_sentences(unfinished + delta)
+                        for sentence in sentences:
+                            speak(sentence)
+            finally:
+                saved = save_session(session_id, conversation_manager)
+            if not saved:
+                await websocket.send_json({"type": "error", "message": SESSION_CONFLICT_MESSAGE})
+                return
+            if unfinished.strip():
+                speak(unfinished.strip())
+            
+            await websocket.send_json({
+                "type": "response",
+                "content": "".join(parts),
+                "system_role": conversation_manager.system_role,
+                "assistant_role": conversation_manager.assistant_role
+            })
+        finally:
+            audio_queue.put_nowait(None)
+            await sender
 
+async def run_voice_turns(websocket: WebSocket, session_id: str, segments: asyncio.Queue):
+    """Process voice utterances one at a time while the socket keeps receiving audio"""
+    while True:
+        pcm, sample_rate = await segments.get()
+        try:
+            await voice_turn(websocket, session_id, pcm, sample_rate)
+        except WebSocketDisconnect:
+            return
+        except Exception as e:
+            await websocket.send_json({"type": "error", "message": f"Voice turn failed: {e}"})
 
+async def push_analysis(websocket: WebSocket, job):
+    """Send an analysis result over the socket once its job finishes"""
+    job = await analysis_queue.wait(job)
+    await websocket.send_json({"type": "analysis", **job.to_dict()})
 
 @app.websocket("/ws")
-async def websocket_endpoint(websocket: WebSocket):
+async def websocket_endpoint(websocket: WebSocket, session_id: Optional[str] = None):
     await websocket.accept()
+    if not session_id or session_store.get(session_id) is None:
+        await websocket.send_json({"type": "error", "message": "Session not found or expired."})
+        await websocket.close(code=4404)
+        return
+    
+    # Voice mode state: binary frames are PCM16 mono audio cut into utterances by the VAD
+    vad = None
+    voice_segments: asyncio.Queue = asyncio.Queue()
+    voice_worker = None
+    analysis_pushes = set()
     try:
         while True:
-            data = await websocket.receive_text()
-            # Process the received data
-            data_json = json.loads(data)
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(message.get("code", 1000))
             
-            if data_json["action"] == "message":
-                # Handle new message
-                ai_response = conversation_manager.get_ai_response(data_json["content"])
-                await websocket.send_json({
-                    "type": "response",
-                    "content": ai_response,
-                    "system_role": conversation_manager.system_role,
-                    "assistant_role": conversation_manager.assistant_role
-                })
+            if message.get("bytes") is not None:
+                if vad is not None:
+                    for segment in vad.feed(message["bytes"]):
+                        voice_segments.put_nowait((segment, vad.sample_rate))
+                continue
             
-            elif data_json["action"] == "switch_roles":
-                # Handle role switching
-                conversation_manager.switch_roles()
-                await websocket.send_json({
-                    "type": "roles_updated",
-                    "system_role": conversation_manager.system_role,
-                    "assistant_role": conversation_manager.assistant_role
-                })
+            # Process the received data
+            with metrics.timer("parse"):
+                data_json = json.loads(message["text"])
+            
+            # Turns that change the conversation wait for any voice turn running on this session
+            turn_lock = session_lock(session_id) if data_json["action"] in ("message", "switch_roles") else contextlib.nullcontext()
+            async with turn_lock:
+                # Resolve the session on every frame so idle expiry and other workers' writes are honored
+                conversation_manager = session_store.get(session_id)
+                if conversation_manager is None:
+                    await websocket.send_json({"type": "error", "message": "Session not found or expired."})
+                    await websocket.close(code=4404)
+                    return
+                
+                if data_json["action"] == "message" and data_json.get("stream"):
+                    # Stream the reply as delta frames, then send the assembled response
+                    parts = []
+                    try:
+                        async with contextlib.aclosing(conversation_manager.stream_ai_response(data_json["content"])) as deltas:
+                            async for delta in deltas:
+                                parts.append(delta)
+                                await websocket.send_json({"type": "delta", "content": delta})
+                    finally:
+                        saved = save_session(session_id, conversation_manager)
+                    if not saved:
+                        await websocket.send_json({"type": "error", "message": SESSION_CONFLICT_MESSAGE})
+                        continue
+                    await websocket.send_json({
+                        "type": "response",
+                        "content": "".join(parts),
+                        "system_role": conversation_manager.system_role,
+                        "assistant_role": conversation_manager.assistant_role
+                    })
+                
+                elif data_json["action"] == "message":
+                    # Handle new message
+                    ai_response = await conversation_manager.get_ai_response_async(data_json["content"])
+                    if not save_session(session_id, conversation_manager):
+                        await websocket.send_json({"type": "error", "message": SESSION_CONFLICT_MESSAGE})
+                        continue
+                    await websocket.send_json({
+                        "type": "response",
+                        "content": ai_response,
+                        "system_role": conversation_manager.system_role,
+                        "assistant_role": conversation_manager.assistant_role
+                    })
+                
+                elif data_json["action"] == "tts":
+                    # Synthesize text; binary mode relays raw audio frames instead of base64 JSON
+                    if data_json.get("binary"):
+                        try:
+                            media_type, chunks = await audio_processor.open_speech_stream(data_json["text"], data_json.get("voice", "default"))
+                            await websocket.send_json({"type": "audio_start", "media_type": media_type})
+                            async for chunk in chunks:
+                                await websocket.send_bytes(chunk)
+                            await websocket.send_json({"type": "audio_end"})
+                        except WebSocketDisconnect:
+                            raise
+                        except Exception as e:
+                            # Keep the socket (and any voice worker) alive when synthesis fails
+                            await websocket.send_json({"type": "error", "message": f"Text-to-speech failed: {e}"})
+                    else:
+                        result = await audio_processor.text_to_speech(data_json["text"], data_json.get("voice", "default"))
+                        await websocket.send_json({"type": "audio", **result})
+                
+                elif data_json["action"] == "analyze":
+                    # Run the analysis in the background and push the result when it is ready
+                    if len(conversation_manager.conversation_history) <= 1:
+                        await websocket.send_json({"type": "analysis", "status": "error", "message": "Not enough conversation history to analyze."})
+                    else:
+                        job = analysis_queue.submit(
+                            session_id,
+                            conversation_manager.system_role,
+                            conversation_manager.conversation_history[1:],
+                            data_json.get("include_suggestions", True) is not False
+                        )
+                        push = asyncio.create_task(push_analysis(websocket, job))
+                        analysis_pushes.add(push)
+                        push.add_done_callback(analysis_pushes.discard)
+                
+                elif data_json["action"] == "voice_start":
+                    # Begin accepting binary audio frames
+                    try:
+                        vad = EnergyVAD(
+                            sample_rate=int(data_json.get("sample_rate", 16000)),
+                            threshold=settings.voice_vad_threshold,
+                            silence_ms=settings.voice_silence_ms
+                        )
+                    except (TypeError, ValueError) as e:
+                        await websocket.send_json({"type": "error", "message": f"Voice mode unavailable: {e}"})
+                        continue
+                    if voice_worker is None:
+                        voice_worker = asyncio.create_task(run_voice_turns(websocket, session_id, voice_segments))
+                    await websocket.send_json({"type": "voice_ready"})
+                
+                elif data_json["action"] == "voice_end":
+                    # Flush the utterance in progress
+                    if vad is not None:
+                        segment = vad.flush()
+                        if segment:
+                            voice_segments.put_nowait((segment, vad.sample_rate))
+                        vad = None
+                
+                elif data_json["action"] == "switch_roles":
+                    # Handle role switching
+                    conversation_manager.switch_roles()
+                    if not save_session(session_id, conversation_manager):
+                        await websocket.send_json({"type": "error", "message": SESSION_CONFLICT_MESSAGE})
+                        continue
+                    await websocket.send_json({
+                        "type": "roles_updated",
+                        "system_role": conversation_manager.system_role,
+                        "assistant_role": conversation_manager.assistant_role
+                    })
                 
     except WebSocketDisconnect:
         print("Client disconnected")
+    finally:
+        if voice_worker is not None:
+            voice_worker.cancel()
+        for push in analysis_pushes:
+            push.cancel()
 
 if __name__ == "__main__":
+    import uvicorn
+    
+    # Single-process development server; use `python -m app.server` for multiple workers
     uvicorn.run("app.main:app", host="0.0.0.0", port=8000, reload=True)
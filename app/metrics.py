@@ -0,0 +1,196 @@
+import time
+import bisect
+import asyncio
+import functools
+import threading
+import contextvars
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from fastapi.routing import APIRoute
+
+# Latency buckets in seconds, from cache hits up to slow model calls
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# (stage, seconds) timings recorded while handling the current request, for the Server-Timing header
+_request_timings: contextvars.ContextVar[Optional[List[Tuple[str, float]]]] = contextvars.ContextVar(
+    "request_timings", default=None
+)
+_request_started: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("request_started", default=None)
+
+
+class Histogram:
+    """Cumulative-bucket histogram keyed by a tuple of label values"""
+
+    def __init__(self, name: str, help_text: str, label_names: Tuple[str, ...], buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = tuple(buckets)
+        # labels -> [per-bucket counts (+Inf last), sum, count]
+        self._series: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, labels: Tuple[str, ...], value: float):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.help_text}"
+        yield f"# TYPE {self.name} histogram"
+        for labels, (counts, total, count) in sorted(self._series.items()):
+            label_text = ",".join(f'{name}="{value}"' for name, value in zip(self.label_names, labels))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                yield f'{self.name}_bucket{{{label_text},le="{le}"}} {cumulative}'
+            yield f"{self.name}_sum{{{label_text}}} {total:.6f}"
+            yield f"{self.name}_count{{{label_text}}} {count}"
+
+
+class Metrics:
+    """Process-wide latency histograms and token counters, rendered in Prometheus text format"""
+
+    def __init__(self, prefix: str = "sales_trainer"):
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self.stages = Histogram(
+            f"{prefix}_stage_duration_seconds", "Time spent in each pipeline stage", ("stage",)
+        )
+        self.requests = Histogram(
+            f"{prefix}_request_duration_seconds", "HTTP request latency until the response headers", ("endpoint", "status")
+        )
+        # (model, kind) -> tokens, where kind is prompt or completion
+        self.tokens: Dict[Tuple[str, str], int] = {}
+
+    def observe(self, stage: str, seconds: float):
+        """Record a stage timing, also adding it to the current request's Server-Timing entries"""
+        with self._lock:
+            self.stages.observe((stage,), seconds)
+        timings = _request_timings.get()
+        if timings is not None:
+            timings.append((stage, seconds))
+
+    @contextmanager
+    def timer(self, stage: str):
+        """Time the enclosed block as one observation of a stage"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - started)
+
+    def timed(self, stage: str) -> Callable:
+        """Decorator timing every call of an async function as a stage"""
+        def decorator(func):
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                with self.timer(stage):
+                    return await func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def mark_parsed(self):
+        """Record the time from request arrival until the endpoint runs (routing, validation, dependencies)"""
+        started = _request_started.get()
+        if started is not None:
+            self.observe("parse", time.perf_counter() - started)
+
+    def record_usage(self, model: str, usage: Any):
+        """Add the token counts from an OpenAI response.usage object"""
+        if usage is None:
+            return
+        with self._lock:
+            for kind in ("prompt", "completion"):
+                count = getattr(usage, f"{kind}_tokens", None) or 0
+                self.tokens[(model, kind)] = self.tokens.get((model, kind), 0) + count
+
+    def render(self, gauges: Optional[Dict[str, float]] = None) -> str:
+        """Prometheus exposition text; gauges are point-in-time values such as session and cache counts"""
+        with self._lock:
+            lines = list(self.stages.render())
+            lines += self.requests.render()
+            name = f"{self.prefix}_llm_tokens_total"
+            lines.append(f"# HELP {name} Tokens reported in model responses")
+            lines.append(f"# TYPE {name} counter")
+            for (model, kind), count in sorted(self.tokens.items()):
+                lines.append(f'{name}{{model="{model}",kind="{kind}"}} {count}')
+        for gauge, value in sorted((gauges or {}).items()):
+            name = f"{self.prefix}_{gauge}"
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def flatten_stats(prefix: str, stats: Dict[str, Any]) -> Dict[str, float]:
+    """Flatten nested numeric stats dicts into gauge names"""
+    gauges = {}
+    for key, value in stats.items():
+        name = f"{prefix}_{key}"
+        if isinstance(value, dict):
+            gauges.update(flatten_stats(name, value))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            gauges[name] = value
+    return gauges
+
+
+class TimingMiddleware:
+    """ASGI middleware recording request latency and optionally adding a Server-Timing header"""
+
+    def __init__(self, app, metrics: "Metrics", server_timing: bool = False):
+        self.app = app
+        self.metrics = metrics
+        self.server_timing = server_timing
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        timings: List[Tuple[str, float]] = []
+        started_token = _request_started.set(started)
+        timings_token = _request_timings.set(timings)
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                elapsed = time.perf_counter() - started
+                endpoint = getattr(scope.get("endpoint"), "__name__", "unmatched")
+                with self.metrics._lock:
+                    self.metrics.requests.observe((endpoint, str(message["status"])), elapsed)
+                if self.server_timing:
+                    entries = [f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in timings]
+                    entries.append(f"total;dur={elapsed * 1000:.1f}")
+                    headers = list(message.get("headers", []))
+                    headers.append((b"server-timing", ", ".join(entries).encode("latin-1")))
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _request_started.reset(started_token)
+            _request_timings.reset(timings_token)
+
+
+class TimedRoute(APIRoute):
+    """API route that records request parse time when the endpoint body starts"""
+
+    def __init__(self, path: str, endpoint: Callable, **kwargs: Any):
+        if asyncio.iscoroutinefunction(endpoint):
+            original = endpoint
+
+            @functools.wraps(original)
+            async def endpoint(*args, **kwargs):
+                metrics.mark_parsed()
+                return await original(*args, **kwargs)
+
+        super().__init__(path, endpoint, **kwargs)
+
+
+# Process-wide metrics registry
+metrics = Metrics()
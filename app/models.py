@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, field_validator
 from typing import Optional, List, Dict, Any
 
 class ConversationRequest(BaseModel):
@@ -18,4 +18,32 @@ class SpeechRequest(BaseModel):
 
 class FeedbackRequest(BaseModel):
     """Request model for conversation analysis"""
-    include_suggestions: Optional[bool] = True
\ No newline at end of file
+    include_suggestions: Optional[bool] = True
+
+class ConversationFeedback(BaseModel):
+    """Structured conversation analysis produced by the model"""
+    strengths: List[str] = []
+    weaknesses: List[str] = []
+    key_moments: List[str] = []
+    improvement_suggestions: Optional[List[str]] = None
+    role_specific_feedback: str = ""
+    
+    @field_validator("strengths", "weaknesses", "key_moments", "improvement_suggestions", mode="before")
+    @classmethod
+    def coerce_list(cls, value: Any) -> Any:
+        """Accept a single string or a list of non-string items"""
+        if isinstance(value, str):
+            return [value]
+        if isinstance(value, list):
+            return [item if isinstance(item, str) else str(item) for item in value]
+        return value
+    
+    @field_validator("role_specific_feedback", mode="before")
+    @classmethod
+    def coerce_text(cls, value: Any) -> Any:
+        """Join list-shaped feedback into one paragraph"""
+        if isinstance(value, list):
+            return " ".join(str(item) for item in value)
+        if isinstance(value, dict):
+            return " ".join(f"{key}: {item}" for key, item in value.items())
+        return value
\ No newline at end of file
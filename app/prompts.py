@@ -0,0 +1,90 @@
+import sys
+import json
+import itertools
+from types import MappingProxyType
+from typing import Any, Dict, Mapping, Tuple
+
+from functions.config import settings
+
+
+class InvalidConversationConfig(ValueError):
+    """Raised for an unknown role or scenario, or an invalid pairing of roles"""
+
+
+class PromptTable:
+    """Immutable table of every (assistant_role, system_role, scenario) system prompt, built once"""
+
+    def __init__(self, data: Dict[str, Any]):
+        role_prompts = data["role_prompts"]
+        scenario_prompts = data["scenario_prompts"]
+        template = "\n".join(data["system_prompt_template"])
+
+        self.roles: Tuple[str, ...] = tuple(role_prompts)
+        self.scenarios: Tuple[str, ...] = tuple(scenario_prompts)
+        for role, prompts in role_prompts.items():
+            missing = set(self.scenarios) - set(prompts)
+            if missing:
+                raise InvalidConversationConfig(f"Role '{role}' has no prompt for: {', '.join(sorted(missing))}")
+
+        self.role_prompts: Mapping[str, Mapping[str, str]] = MappingProxyType({
+            role: MappingProxyType({scenario: sys.intern(text) for scenario, text in prompts.items()})
+            for role, prompts in role_prompts.items()
+        })
+        self.scenario_prompts: Mapping[str, str] = MappingProxyType({
+            scenario: sys.intern(text) for scenario, text in scenario_prompts.items()
+        })
+
+        system_prompts = {}
+        for assistant_role, system_role, scenario in itertools.product(self.roles, self.roles, self.scenarios):
+            if assistant_role == system_role:
+                continue
+            prompt = template.format(
+                assistant_role_upper=assistant_role.upper(),
+                system_role_upper=system_role.upper(),
+                scenario_prompt=self.scenario_prompts[scenario],
+                role_prompt=self.role_prompts[assistant_role][scenario],
+                scenario_name=scenario.replace("_", " ")
+            )
+            system_prompts[(assistant_role, system_role, scenario)] = sys.intern(prompt)
+        self.system_prompts: Mapping[Tuple[str, str, str], str] = MappingProxyType(system_prompts)
+
+    def validate(self, assistant_role: str, system_role: str, scenario: str):
+        """Reject unknown roles or scenarios, or both parties playing one role, before any state changes"""
+        for role in (assistant_role, system_role):
+            if role not in self.role_prompts:
+                raise InvalidConversationConfig(f"Unknown role '{role}'. Expected one of: {', '.join(self.roles)}")
+        if assistant_role == system_role:
+            raise InvalidConversationConfig(f"The assistant and the user cannot both play '{assistant_role}'")
+        if scenario not in self.scenario_prompts:
+            raise InvalidConversationConfig(
+                f"Unknown scenario '{scenario}'. Expected one of: {', '.join(self.scenarios)}"
+            )
+
+    def system_prompt(self, assistant_role: str, system_role: str, scenario: str) -> str:
+        """Look up the precompiled system prompt"""
+        try:
+            return self.system_prompts[(assistant_role, system_role, scenario)]
+        except KeyError:
+            self.validate(assistant_role, system_role, scenario)
+            raise
+
+    def guidance(self, system_role: str, scenario: str) -> str:
+        """Role guidance shown to the user"""
+        return self.role_prompts[system_role][scenario]
+
+    def counterpart(self, role: str) -> str:
+        """The other role in a two-party conversation"""
+        others = [other for other in self.roles if other != role]
+        if not others:
+            raise InvalidConversationConfig(f"No counterpart role for '{role}'")
+        return others[0]
+
+
+def load_prompt_table(path: str) -> PromptTable:
+    """Load and compile the prompt table from a JSON data file"""
+    with open(path, encoding="utf-8") as f:
+        return PromptTable(json.load(f))
+
+
+# Process-wide prompt table
+prompt_table = load_prompt_table(settings.prompts_path)
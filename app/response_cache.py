@@ -0,0 +1,142 @@
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from functions.config import settings
+
+WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_messages(messages: List[Dict[str, str]]) -> List[Tuple[str, str]]:
+    """Collapse whitespace and case in user turns so trivially different openings share a key"""
+    normalized = []
+    for message in messages:
+        content = WHITESPACE.sub(" ", message["content"]).strip()
+        if message["role"] == "user":
+            content = content.lower()
+        normalized.append((message["role"], content))
+    return normalized
+
+
+class ResponseCache:
+    """TTL + LRU cache of model replies keyed on the normalized prompt, persisted to SQLite"""
+
+    def __init__(
+        self,
+        path: Optional[str] = "response_cache.db",
+        max_entries: int = 10000,
+        ttl_seconds: float = 86400,
+        max_user_turns: int = 4
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_user_turns = max_user_turns
+        # key -> (response, expires_at); ordered from least to most recently used
+        self._memory: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = {"memory": 0, "sqlite": 0}
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+
+        self._conn = None
+        if path:
+            self._conn = sqlite3.connect(
+                path, timeout=settings.sqlite_busy_timeout_seconds, check_same_thread=False, isolation_level=None
+            )
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, response TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+
+    def key(self, params: Dict[str, Any]) -> Optional[str]:
+        """Cache key for a chat request, or None if the history is too long to be worth caching"""
+        messages = params["messages"]
+        if sum(1 for message in messages if message["role"] == "user") > self.max_user_turns:
+            return None
+        payload = {name: value for name, value in params.items() if name != "messages"}
+        payload["messages"] = normalize_messages(messages)
+        return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                response, expires_at = entry
+                if expires_at > now:
+                    self._memory.move_to_end(key)
+                    self.hits["memory"] += 1
+                    return response
+                del self._memory[key]
+
+            if self._conn is not None:
+                row = self._conn.execute(
+                    "SELECT response, expires_at FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None and row[1] > now:
+                    self.hits["sqlite"] += 1
+                    self._put_memory(key, row[0], row[1])
+                    return row[0]
+
+            self.misses += 1
+            return None
+
+    def put(self, key: str, response: str):
+        expires_at = time.time() + self.ttl_seconds
+        with self._lock:
+            self.stores += 1
+            self._put_memory(key, response, expires_at)
+            if self._conn is not None:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO responses (key, response, expires_at) VALUES (?, ?, ?)",
+                    (key, response, expires_at)
+                )
+                if self.stores % 100 == 0:
+                    self._conn.execute("DELETE FROM responses WHERE expires_at < ?", (time.time(),))
+
+    def _put_memory(self, key: str, response: str, expires_at: float):
+        self._memory[key] = (response, expires_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "memory_hits": self.hits["memory"],
+            "sqlite_hits": self.hits["sqlite"],
+            "misses": self.misses,
+            "stores": self.stores,
+            "evictions": self.evictions,
+            "entries": len(self._memory)
+        }
+
+    def close(self):
+        if self._conn is not None:
+            with self._lock:
+                self._conn.close()
+                self._conn = None
+
+
+_response_cache: Optional[ResponseCache] = None
+
+def get_response_cache() -> Optional[ResponseCache]:
+    """Return the process-wide response cache, or None unless RESPONSE_CACHE_ENABLED is set"""
+    global _response_cache
+    if not settings.response_cache_enabled:
+        return None
+    if _response_cache is None:
+        _response_cache = ResponseCache(
+            path=settings.response_cache_path or None,
+            max_entries=settings.response_cache_max_entries,
+            ttl_seconds=settings.response_cache_ttl_seconds,
+            max_user_turns=settings.response_cache_max_user_turns
+        )
+    return _response_cache
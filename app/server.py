@@ -0,0 +1,51 @@
+"""Production launcher: serves the app from several worker processes.
+
+    python -m app.server                     # one worker per core (WEB_CONCURRENCY)
+    python -m app.server --workers 4 --port 8000
+
+Workers share conversations and analysis jobs through the SQLite session
+backend, so any worker can serve any request for a session. A /ws connection
+stays on the worker that accepted it and re-reads the session on every frame,
+so turns sent over HTTP to other workers are picked up immediately. Saves are
+compare-and-swap on a per-session version: when two workers run turns on one
+session at once, the later save is rejected (409, or an error frame on /ws)
+instead of overwriting the earlier turn.
+
+The SQLite file is local to one host. When a load balancer spreads traffic
+over several hosts, route each session to one host, keyed on the session_id
+query parameter or X-Session-ID header, so /ws and HTTP calls for a
+conversation land on the same host.
+"""
+import os
+import argparse
+
+import uvicorn
+
+from functions.config import settings
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the app with multiple worker processes")
+    parser.add_argument("--host", default=settings.server_host)
+    parser.add_argument("--port", type=int, default=settings.server_port)
+    parser.add_argument("--workers", type=int, default=settings.server_workers)
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args(argv)
+
+    if args.workers > 1 and settings.session_backend == "memory":
+        # Process-local sessions would scatter a user's turns across workers
+        print(f"{args.workers} workers need shared sessions; using the sqlite backend at {settings.session_db_path}")
+        os.environ["SESSION_BACKEND"] = "sqlite"
+
+    uvicorn.run(
+        "app.main:app",
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        proxy_headers=True,
+        log_level=args.log_level
+    )
+
+
+if __name__ == "__main__":
+    main()
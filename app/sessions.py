@@ -0,0 +1,209 @@
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from app.conversation import ConversationManager
+
+
+class SessionConflict(Exception):
+    """Raised by save() when another request wrote the session after this copy was loaded"""
+
+
+class SessionStore(ABC):
+    """Base class for session-keyed conversation state"""
+
+    def new_session_id(self) -> str:
+        """Issue a new, unguessable session ID"""
+        return uuid.uuid4().hex
+
+    @abstractmethod
+    def get(self, session_id: str) -> Optional[ConversationManager]:
+        """Return the conversation for a session, or None if unknown or expired"""
+
+    @abstractmethod
+    def save(self, session_id: str, manager: ConversationManager):
+        """Persist the conversation state for a session; raises SessionConflict if a newer write would be lost"""
+
+    @abstractmethod
+    def delete(self, session_id: str):
+        """Drop a session"""
+
+    @abstractmethod
+    def __len__(self) -> int:
+        """Number of stored sessions"""
+
+    def close(self):
+        """Release any resources held by the store"""
+
+
+class InMemorySessionStore(SessionStore):
+    """Process-local LRU store with idle-session TTL"""
+
+    def __init__(self, max_sessions: int = 5000, ttl_seconds: float = 3600):
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        # session_id -> (manager, last_access); ordered from least to most recently used
+        self._sessions: "OrderedDict[str, Tuple[ConversationManager, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session_id: str) -> Optional[ConversationManager]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                return None
+            manager, last_access = entry
+            if now - last_access > self.ttl_seconds:
+                del self._sessions[session_id]
+                return None
+            self._sessions[session_id] = (manager, now)
+            self._sessions.move_to_end(session_id)
+            return manager
+
+    def save(self, session_id: str, manager: ConversationManager):
+        now = time.monotonic()
+        with self._lock:
+            self._sessions[session_id] = (manager, now)
+            self._sessions.move_to_end(session_id)
+            self._evict(now)
+
+    def delete(self, session_id: str):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def _evict(self, now: float):
+        """Drop expired sessions and enforce the size cap, oldest first"""
+        while self._sessions:
+            session_id, (_, last_access) = next(iter(self._sessions.items()))
+            if len(self._sessions) <= self.max_sessions and now - last_access <= self.ttl_seconds:
+                break
+            del self._sessions[session_id]
+
+
+class SQLiteSessionStore(SessionStore):
+    """SQLite-backed store; conversation state is kept as JSON keyed by session ID, with a version bumped on every save"""
+
+    # Run the expiry sweep once every this many writes
+    SWEEP_INTERVAL = 100
+    # A read refreshes updated_at only when it is older than this fraction of the TTL
+    TOUCH_FRACTION = 0.1
+
+    def __init__(
+        self,
+        path: str = "sessions.db",
+        max_sessions: int = 5000,
+        ttl_seconds: float = 3600,
+        busy_timeout: float = 5.0
+    ):
+        self.path = path
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._writes = 0
+        # Several worker processes may share the file; wait for their write locks instead of failing
+        self._conn = sqlite3.connect(path, timeout=busy_timeout, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "session_id TEXT PRIMARY KEY, data TEXT NOT NULL, updated_at REAL NOT NULL, "
+            "version INTEGER NOT NULL DEFAULT 0)"
+        )
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(sessions)")}
+        if "version" not in columns:
+            # Table created before versioning
+            self._conn.execute("ALTER TABLE sessions ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS sessions_updated_at ON sessions (updated_at)")
+
+    def get(self, session_id: str) -> Optional[ConversationManager]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data, updated_at, version FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            data, updated_at, version = row
+            if now - updated_at > self.ttl_seconds:
+                self._conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+                return None
+            if now - updated_at > self.ttl_seconds * self.TOUCH_FRACTION:
+                # Reads are frequent (every /ws frame); refresh the idle timer only once it has aged,
+                # so most reads take no write lock
+                self._conn.execute(
+                    "UPDATE sessions SET updated_at = ? WHERE session_id = ?", (now, session_id)
+                )
+        manager = ConversationManager.from_dict(json.loads(data))
+        manager.version = version
+        return manager
+
+    def save(self, session_id: str, manager: ConversationManager):
+        data = json.dumps(manager.to_dict())
+        now = time.time()
+        with self._lock:
+            if manager.version is None:
+                # New session: insert, unless the ID is already taken
+                cursor = self._conn.execute(
+                    "INSERT OR IGNORE INTO sessions (session_id, data, updated_at, version) VALUES (?, ?, ?, 1)",
+                    (session_id, data, now)
+                )
+            else:
+                # Compare-and-swap against the version this copy was loaded at, so a turn that ran
+                # concurrently in another worker is reported instead of silently overwritten
+                cursor = self._conn.execute(
+                    "UPDATE sessions SET data = ?, updated_at = ?, version = version + 1 "
+                    "WHERE session_id = ? AND version = ?",
+                    (data, now, session_id, manager.version)
+                )
+            if cursor.rowcount == 0:
+                raise SessionConflict(session_id)
+            manager.version = 1 if manager.version is None else manager.version + 1
+            self._writes += 1
+            if self._writes % self.SWEEP_INTERVAL == 0:
+                self._evict(now)
+
+    def delete(self, session_id: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _evict(self, now: float):
+        """Drop expired sessions and trim the table to the size cap"""
+        self._conn.execute("DELETE FROM sessions WHERE updated_at < ?", (now - self.ttl_seconds,))
+        self._conn.execute(
+            "DELETE FROM sessions WHERE session_id IN ("
+            "SELECT session_id FROM sessions ORDER BY updated_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_sessions,)
+        )
+
+
+def create_session_store(settings) -> SessionStore:
+    """Build the session store selected by settings.session_backend"""
+    if settings.session_backend == "sqlite":
+        return SQLiteSessionStore(
+            path=settings.session_db_path,
+            max_sessions=settings.session_max_sessions,
+            ttl_seconds=settings.session_ttl_seconds,
+            busy_timeout=settings.sqlite_busy_timeout_seconds
+        )
+    if settings.session_backend == "memory":
+        return InMemorySessionStore(
+            max_sessions=settings.session_max_sessions,
+            ttl_seconds=settings.session_ttl_seconds
+        )
+    raise ValueError(f"Unknown session backend: {settings.session_backend}")
@@ -0,0 +1,43 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+
+class SingleFlight:
+    """Coalesces concurrent identical calls onto one shared upstream task"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._in_flight: Dict[Hashable, asyncio.Task] = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    def in_flight(self, key: Hashable) -> bool:
+        return key in self._in_flight
+
+    def start(self, key: Hashable, call: Callable[[], Awaitable[Any]]) -> Tuple[asyncio.Task, bool]:
+        """Join the task running for key, or start call() as it; returns (task, whether this caller started it)"""
+        task = self._in_flight.get(key)
+        if task is not None:
+            self.coalesced += 1
+            return task, False
+        self.calls += 1
+        task = asyncio.ensure_future(call())
+        self._in_flight[key] = task
+        task.add_done_callback(lambda done: self._forget(key, done))
+        return task, True
+
+    async def do(self, key: Hashable, call: Callable[[], Awaitable[Any]]) -> Any:
+        """Run call() once per key at a time; concurrent callers await the same result"""
+        task, _ = self.start(key, call)
+        # A cancelled waiter must not cancel the upstream call other waiters share
+        return await asyncio.shield(task)
+
+    def _forget(self, key: Hashable, task: asyncio.Task):
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+        if not task.cancelled():
+            # Mark the exception as retrieved even if every waiter went away
+            task.exception()
+
+    def stats(self) -> Dict[str, int]:
+        return {"calls": self.calls, "coalesced": self.coalesced, "in_flight": len(self._in_flight)}
@@ -0,0 +1,184 @@
+"""Fingerprinted, precompressed static assets.
+
+Templates link assets through asset_url(), which embeds a content hash in the
+file name (css/styles.css -> css/styles.3f2a9c1b7d.css). Fingerprinted URLs are
+served with a one-year immutable Cache-Control; plain URLs keep revalidating.
+Text assets are sent brotli- or gzip-encoded when the client accepts it.
+
+Run `python -m app.static_assets` at build time to write .gz (and .br, if the
+brotli package is installed) files next to each asset; anything not
+precompressed is compressed on first request and kept in memory.
+"""
+import os
+import re
+import sys
+import gzip
+import hashlib
+import mimetypes
+from typing import Dict, Optional, Tuple
+
+from starlette.datastructures import Headers
+from starlette.responses import Response
+from starlette.staticfiles import StaticFiles
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+COMPRESSIBLE_EXTENSIONS = {".css", ".js", ".html", ".svg", ".json", ".txt", ".map"}
+
+FINGERPRINT_LENGTH = 10
+
+# name.<fingerprint>.ext
+FINGERPRINTED = re.compile(r"^(?P<stem>.+)\.(?P<hash>[0-9a-f]{%d})(?P<ext>\.[^./]+)$" % FINGERPRINT_LENGTH)
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+
+
+def compress(data: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(data, quality=11)
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+def encodings() -> Tuple[str, ...]:
+    """Supported content encodings, best first"""
+    return ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+class FingerprintedStaticFiles(StaticFiles):
+    """StaticFiles with content-hashed URLs, long-lived caching and precompressed variants"""
+
+    def __init__(self, directory: str, url_prefix: str = "/static", **kwargs):
+        super().__init__(directory=directory, **kwargs)
+        self.root = directory
+        self.url_prefix = url_prefix.rstrip("/")
+        # Relative path -> fingerprint, built on first use
+        self._fingerprints: Optional[Dict[str, str]] = None
+        # (relative path, encoding) -> compressed bytes, for assets without a precompressed file
+        self._compressed: Dict[Tuple[str, str], bytes] = {}
+
+    def fingerprints(self) -> Dict[str, str]:
+        if self._fingerprints is None:
+            fingerprints = {}
+            for dirpath, _, filenames in os.walk(self.root):
+                for filename in filenames:
+                    if filename.endswith((".gz", ".br")):
+                        continue
+                    full_path = os.path.join(dirpath, filename)
+                    relative = os.path.relpath(full_path, self.root).replace(os.sep, "/")
+                    with open(full_path, "rb") as f:
+                        fingerprints[relative] = hashlib.sha256(f.read()).hexdigest()[:FINGERPRINT_LENGTH]
+            self._fingerprints = fingerprints
+        return self._fingerprints
+
+    def url(self, path: str) -> str:
+        """Fingerprinted URL for an asset; unknown paths get the plain URL"""
+        path = path.lstrip("/")
+        fingerprint = self.fingerprints().get(path)
+        if fingerprint is None:
+            return f"{self.url_prefix}/{path}"
+        stem, ext = os.path.splitext(path)
+        return f"{self.url_prefix}/{stem}.{fingerprint}{ext}"
+
+    def resolve(self, path: str) -> Tuple[str, bool]:
+        """Map a requested path to (asset path, whether the URL carried the current fingerprint)"""
+        path = path.replace(os.sep, "/")
+        match = FINGERPRINTED.match(path)
+        if match:
+            original = match.group("stem") + match.group("ext")
+            fingerprint = self.fingerprints().get(original)
+            if fingerprint is not None:
+                # An outdated fingerprint (a page cached across a deploy) gets the current file, revalidated
+                return original, fingerprint == match.group("hash")
+        return path, False
+
+    def _variant(self, path: str, encoding: str) -> Optional[bytes]:
+        """Compressed bytes of an asset, from a precompressed file or compressed once in memory"""
+        key = (path, encoding)
+        data = self._compressed.get(key)
+        if data is not None:
+            return data
+        full_path = os.path.join(self.root, path)
+        suffix = ".br" if encoding == "br" else ".gz"
+        try:
+            if os.path.getmtime(full_path + suffix) >= os.path.getmtime(full_path):
+                with open(full_path + suffix, "rb") as f:
+                    data = f.read()
+            else:
+                raise OSError("stale precompressed file")
+        except OSError:
+            try:
+                with open(full_path, "rb") as f:
+                    data = compress(f.read(), encoding)
+            except OSError:
+                return None
+        self._compressed[key] = data
+        return data
+
+    def _compressed_response(self, path: str, fingerprinted: bool, scope) -> Optional[Response]:
+        if scope["method"] not in ("GET", "HEAD") or os.path.splitext(path)[1] not in COMPRESSIBLE_EXTENSIONS:
+            return None
+        if path not in self.fingerprints():
+            return None
+        request_headers = Headers(scope=scope)
+        accepted = {
+            token.split(";")[0].strip()
+            for token in request_headers.get("accept-encoding", "").split(",")
+        }
+        for encoding in encodings():
+            if encoding not in accepted:
+                continue
+            etag = f'"{self.fingerprints()[path]}-{encoding}"'
+            headers = {
+                "Content-Encoding": encoding,
+                "Vary": "Accept-Encoding",
+                "ETag": etag,
+                "Cache-Control": IMMUTABLE if fingerprinted else REVALIDATE
+            }
+            if request_headers.get("if-none-match") == etag:
+                return Response(status_code=304, headers=headers)
+            data = self._variant(path, encoding)
+            if data is None:
+                return None
+            media_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+            if scope["method"] == "HEAD":
+                headers["Content-Length"] = str(len(data))
+                data = b""
+            return Response(data, media_type=media_type, headers=headers)
+        return None
+
+    async def get_response(self, path: str, scope) -> Response:
+        path, fingerprinted = self.resolve(path)
+        response = self._compressed_response(path, fingerprinted, scope)
+        if response is None:
+            response = await super().get_response(path, scope)
+            if response.status_code in (200, 304):
+                response.headers["Cache-Control"] = IMMUTABLE if fingerprinted else REVALIDATE
+                if os.path.splitext(path)[1] in COMPRESSIBLE_EXTENSIONS:
+                    response.headers["Vary"] = "Accept-Encoding"
+        return response
+
+
+def precompress(directory: str) -> int:
+    """Write .gz (and .br) files next to every compressible asset; returns the number written"""
+    written = 0
+    for dirpath, _, filenames in os.walk(directory):
+        for filename in filenames:
+            if os.path.splitext(filename)[1] not in COMPRESSIBLE_EXTENSIONS:
+                continue
+            full_path = os.path.join(dirpath, filename)
+            with open(full_path, "rb") as f:
+                data = f.read()
+            for encoding in encodings():
+                with open(full_path + (".br" if encoding == "br" else ".gz"), "wb") as f:
+                    f.write(compress(data, encoding))
+                written += 1
+    return written
+
+
+if __name__ == "__main__":
+    directory = sys.argv[1] if len(sys.argv) > 1 else "static"
+    print(f"Wrote {precompress(directory)} precompressed files under {directory}/ ({', '.join(encodings())})")
@@ -0,0 +1,142 @@
+import os
+import asyncio
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+
+
+class AudioCache:
+    """Content-addressed cache for synthesized audio: in-memory LRU backed by a disk store"""
+
+    def __init__(self, directory: str = ".tts_cache", memory_max_bytes: int = 32 * 1024 * 1024,
+                 disk_max_bytes: int = 512 * 1024 * 1024):
+        self.directory = directory
+        self.memory_max_bytes = memory_max_bytes
+        self.disk_max_bytes = disk_max_bytes
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self._memory_bytes = 0
+        # key -> file size; ordered from least to most recently used
+        self._disk: "OrderedDict[str, int]" = OrderedDict()
+        self._disk_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = {"memory": 0, "disk": 0}
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+        self._load_disk_index()
+
+    @staticmethod
+    def key(text: str, voice: str, model: str) -> str:
+        """Hash (text, voice, model) into a cache key"""
+        return hashlib.sha256(f"{model}\0{voice}\0{text}".encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key)
+
+    def _load_disk_index(self):
+        """Rebuild the disk index from existing files, oldest access first"""
+        entries = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith(".tmp"):
+                    continue
+                stat = os.stat(os.path.join(root, name))
+                entries.append((stat.st_mtime, name, stat.st_size))
+        for _, key, size in sorted(entries):
+            self._disk[key] = size
+            self._disk_bytes += size
+
+    async def get(self, key: str) -> Optional[bytes]:
+        """Return cached audio, promoting disk hits into memory"""
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+                self.hits["memory"] += 1
+                return data
+            on_disk = key in self._disk
+        if on_disk:
+            data = await asyncio.to_thread(self._read_disk, key)
+            if data is not None:
+                with self._lock:
+                    self.hits["disk"] += 1
+                    self._put_memory(key, data)
+                return data
+        with self._lock:
+            self.misses += 1
+        return None
+
+    async def put(self, key: str, data: bytes):
+        """Store audio in both tiers"""
+        with self._lock:
+            self._put_memory(key, data)
+        await asyncio.to_thread(self._write_disk, key, data)
+
+    def _put_memory(self, key: str, data: bytes):
+        if len(data) > self.memory_max_bytes:
+            return
+        previous = self._memory.pop(key, None)
+        if previous is not None:
+            self._memory_bytes -= len(previous)
+        self._memory[key] = data
+        self._memory_bytes += len(data)
+        while self._memory_bytes > self.memory_max_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+
+    def _read_disk(self, key: str) -> Optional[bytes]:
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            # Refresh mtime so the on-disk order survives restarts
+            os.utime(path)
+        except FileNotFoundError:
+            with self._lock:
+                size = self._disk.pop(key, None)
+                if size is not None:
+                    self._disk_bytes -= size
+            return None
+        with self._lock:
+            if key in self._disk:
+                self._disk.move_to_end(key)
+        return data
+
+    def _write_disk(self, key: str, data: bytes):
+        if len(data) > self.disk_max_bytes:
+            return
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write to a temporary name first so readers never see a partial file
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+        evicted = []
+        with self._lock:
+            previous = self._disk.pop(key, None)
+            if previous is not None:
+                self._disk_bytes -= previous
+            self._disk[key] = len(data)
+            self._disk_bytes += len(data)
+            while self._disk_bytes > self.disk_max_bytes:
+                old_key, size = self._disk.popitem(last=False)
+                self._disk_bytes -= size
+                evicted.append(old_key)
+        for old_key in evicted:
+            try:
+                os.remove(self._path(old_key))
+            except FileNotFoundError:
+                pass
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "memory_hits": self.hits["memory"],
+            "disk_hits": self.hits["disk"],
+            "misses": self.misses,
+            "memory_entries": len(self._memory),
+            "memory_bytes": self._memory_bytes,
+            "disk_entries": len(self._disk),
+            "disk_bytes": self._disk_bytes
+        }
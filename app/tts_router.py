@@ -0,0 +1,182 @@
+import time
+import random
+import asyncio
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+
+from app.clients import ClientPool, clients
+
+# Voices understood by OpenAI TTS; anything else is treated as a local server voice
+OPENAI_VOICES = {"alloy", "ash", "coral", "echo", "fable", "nova", "onyx", "sage", "shimmer"}
+
+
+def resolve_voices(voice: Optional[str], local_default: str, openai_default: str) -> Tuple[str, str]:
+    """Map a requested voice to (local server voice, OpenAI voice)"""
+    if not voice or voice == "default":
+        return local_default, openai_default
+    if voice in OPENAI_VOICES:
+        return local_default, voice
+    return voice, openai_default
+
+
+class TTSBackend:
+    """A local TTS server with a circuit breaker and smoothed latency"""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, url: str, failure_threshold: int = 3, reset_seconds: float = 30.0):
+        self.url = url.rstrip("/")
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        # Exponentially weighted moving average of synthesis latency, in seconds
+        self.latency = 0.5
+        # Round-trip time of the last health probe, kept apart since it says nothing about synthesis speed
+        self.probe_latency: Optional[float] = None
+        self.successes_total = 0
+        self.failures_total = 0
+
+    def available(self, now: float) -> bool:
+        """Whether a request may be sent; an open circuit allows one trial once the reset time passes"""
+        if self.state == self.CLOSED:
+            return True
+        return self.state == self.OPEN and now - self.opened_at >= self.reset_seconds
+
+    def acquire(self, now: float) -> bool:
+        """Claim a request slot just before sending; an expired open circuit moves to half-open for this one trial"""
+        if not self.available(now):
+            return False
+        if self.state == self.OPEN:
+            self.state = self.HALF_OPEN
+        return True
+
+    def release(self):
+        """Give back a half-open trial that ended without a result, so the next request can make it"""
+        if self.state == self.HALF_OPEN:
+            self.state = self.OPEN
+
+    def record_success(self, latency: float):
+        """A synthesis request succeeded: close the circuit and fold its time into the average"""
+        self.successes_total += 1
+        self.failures = 0
+        self.state = self.CLOSED
+        self.latency = 0.8 * self.latency + 0.2 * latency
+
+    def record_probe(self, latency: float):
+        """The server answered a health probe; an open circuit becomes due for its trial, but only synthesis closes it"""
+        self.probe_latency = latency
+        if self.state == self.OPEN:
+            self.opened_at = min(self.opened_at, time.monotonic() - self.reset_seconds)
+
+    def record_failure(self):
+        self.failures_total += 1
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "url": self.url,
+            "state": self.state,
+            "latency_ms": round(self.latency * 1000, 1),
+            "probe_latency_ms": None if self.probe_latency is None else round(self.probe_latency * 1000, 1),
+            "successes": self.successes_total,
+            "failures": self.failures_total
+        }
+
+
+class TTSRouter:
+    """Routes synthesis across local TTS servers, skipping backends whose circuit is open"""
+
+    def __init__(
+        self,
+        urls: List[str],
+        client_pool: Optional[ClientPool] = None,
+        failure_threshold: int = 3,
+        reset_seconds: float = 30.0,
+        probe_interval: float = 10.0,
+        timeout: float = 5.0
+    ):
+        self.backends = [TTSBackend(url, failure_threshold, reset_seconds) for url in urls]
+        self.client_pool = client_pool or clients
+        self.probe_interval = probe_interval
+        self.timeout = timeout
+        self._probe_task: Optional[asyncio.Task] = None
+
+    def candidates(self) -> List[TTSBackend]:
+        """Available backends in try order: one picked with probability inversely proportional to latency, then the rest by latency"""
+        now = time.monotonic()
+        available = [backend for backend in self.backends if backend.available(now)]
+        if len(available) <= 1:
+            return available
+        weights = [1.0 / max(backend.latency, 0.001) for backend in available]
+        first = random.choices(available, weights=weights)[0]
+        rest = sorted((backend for backend in available if backend is not first), key=lambda backend: backend.latency)
+        return [first] + rest
+
+    async def post(self, backend: TTSBackend, payload: Dict[str, Any], stream: bool = False) -> Optional[httpx.Response]:
+        """Send a synthesis request, updating the backend's health; None on failure or if its circuit is open"""
+        if not backend.acquire(time.monotonic()):
+            return None
+        http = self.client_pool.http
+        started = time.monotonic()
+        response = None
+        try:
+            request = http.build_request("POST", f"{backend.url}/synthesize", json=payload, timeout=self.timeout)
+            response = await http.send(request, stream=stream)
+            if response.status_code == 200:
+                backend.record_success(time.monotonic() - started)
+                return response
+        except httpx.HTTPError:
+            pass
+        except asyncio.CancelledError:
+            # The caller went away; hand back a half-open trial rather than count it against the backend
+            backend.release()
+            raise
+        except BaseException:
+            backend.record_failure()
+            raise
+        if response is not None:
+            await response.aclose()
+        backend.record_failure()
+        return None
+
+    async def probe(self, backend: TTSBackend):
+        """Check that a backend is reachable; any non-5xx HTTP response lets an open circuit try a real request"""
+        started = time.monotonic()
+        try:
+            response = await self.client_pool.http.get(backend.url + "/", timeout=self.timeout)
+            if response.status_code < 500:
+                backend.record_probe(time.monotonic() - started)
+                return
+        except httpx.HTTPError:
+            pass
+        backend.record_failure()
+
+    async def _probe_loop(self):
+        while True:
+            await asyncio.gather(*(self.probe(backend) for backend in self.backends))
+            await asyncio.sleep(self.probe_interval)
+
+    def start(self):
+        """Start background health probes"""
+        if self._probe_task is None and self.probe_interval > 0:
+            self._probe_task = asyncio.create_task(self._probe_loop())
+
+    async def stop(self):
+        if self._probe_task is not None:
+            self._probe_task.cancel()
+            try:
+                await self._probe_task
+            except asyncio.CancelledError:
+                pass
+            self._probe_task = None
+
+    def stats(self) -> List[Dict[str, Any]]:
+        return [backend.stats() for backend in self.backends]
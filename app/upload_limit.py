@@ -0,0 +1,56 @@
+from typing import Iterable
+
+from starlette.datastructures import Headers
+from starlette.exceptions import HTTPException
+from starlette.responses import JSONResponse
+
+# Room for multipart boundaries and part headers on top of the file itself
+MULTIPART_OVERHEAD = 64 * 1024
+
+
+class UploadTooLarge(HTTPException):
+    """Raised while reading a request body that grows past the upload limit"""
+
+    def __init__(self, max_bytes: int):
+        super().__init__(status_code=413, detail=f"Audio exceeds the {max_bytes} byte upload limit")
+
+
+def upload_too_large_response(exc: UploadTooLarge) -> JSONResponse:
+    return JSONResponse(status_code=exc.status_code, content={"status": "error", "message": exc.detail})
+
+
+class UploadLimitMiddleware:
+    """ASGI middleware capping request bodies on upload routes before they are parsed or spooled
+
+    A declared Content-Length over the limit is refused without reading the
+    body; chunked uploads are counted as they arrive and cut off at the limit.
+    """
+
+    def __init__(self, app, max_bytes: int, paths: Iterable[str]):
+        self.app = app
+        self.max_bytes = max_bytes
+        self.paths = frozenset(paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+
+        body_limit = self.max_bytes + MULTIPART_OVERHEAD
+        content_length = Headers(scope=scope).get("content-length", "")
+        if content_length.isdigit() and int(content_length) > body_limit:
+            await upload_too_large_response(UploadTooLarge(self.max_bytes))(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > body_limit:
+                    raise UploadTooLarge(self.max_bytes)
+            return message
+
+        await self.app(scope, limited_receive, send)
@@ -0,0 +1,145 @@
+import io
+import re
+import math
+import wave
+from array import array
+from typing import List, Optional, Tuple
+
+from app.clients import ClientPool, clients
+
+# Sentence boundary: terminal punctuation (optionally followed by closing quotes/brackets) then whitespace
+SENTENCE_END = re.compile(r"(?<=[.!?])[\"')\]]*\s+")
+
+# Sample rates accepted from clients; browsers capture at 8-96 kHz
+MIN_SAMPLE_RATE = 8000
+MAX_SAMPLE_RATE = 96000
+
+
+def split_sentences(text: str) -> Tuple[List[str], str]:
+    """Split text into complete sentences and the unfinished remainder"""
+    sentences = []
+    start = 0
+    for match in SENTENCE_END.finditer(text):
+        sentence = text[start:match.end()].strip()
+        if sentence:
+            sentences.append(sentence)
+        start = match.end()
+    return sentences, text[start:]
+
+
+def pcm16_to_wav(pcm: bytes, sample_rate: int) -> bytes:
+    """Wrap mono 16-bit PCM in an in-memory WAV container"""
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(pcm)
+    return buffer.getvalue()
+
+
+class EnergyVAD:
+    """Energy-based voice activity detector that cuts mono PCM16 audio into utterances"""
+
+    def __init__(
+        self,
+        sample_rate: int = 16000,
+        frame_ms: int = 20,
+        threshold: float = 500.0,
+        silence_ms: int = 600,
+        min_speech_ms: int = 200,
+        max_segment_ms: int = 30000
+    ):
+        if not MIN_SAMPLE_RATE <= sample_rate <= MAX_SAMPLE_RATE:
+            raise ValueError(f"Sample rate must be between {MIN_SAMPLE_RATE} and {MAX_SAMPLE_RATE} Hz, got {sample_rate}")
+        self.sample_rate = sample_rate
+        self.frame_bytes = sample_rate * frame_ms // 1000 * 2
+        self.threshold = threshold
+        self.silence_frames = silence_ms // frame_ms
+        self.min_speech_frames = min_speech_ms // frame_ms
+        self.max_segment_frames = max_segment_ms // frame_ms
+        self._pending = b""
+        self._segment = bytearray()
+        self._speech_frames = 0
+        self._trailing_silence = 0
+
+    def _is_speech(self, frame: bytes) -> bool:
+        samples = array("h", frame)
+        rms = math.sqrt(sum(s * s for s in samples) / len(samples))
+        return rms >= self.threshold
+
+    def feed(self, chunk: bytes) -> List[bytes]:
+        """Add audio and return any utterances that have ended"""
+        segments = []
+        data = self._pending + chunk
+        usable = len(data) - len(data) % self.frame_bytes
+        self._pending = data[usable:]
+
+        for offset in range(0, usable, self.frame_bytes):
+            frame = data[offset:offset + self.frame_bytes]
+            if self._is_speech(frame):
+                self._speech_frames += 1
+                self._trailing_silence = 0
+                self._segment += frame
+            elif self._speech_frames:
+                # Keep short pauses inside the utterance
+                self._trailing_silence += 1
+                self._segment += frame
+
+            frames = len(self._segment) // self.frame_bytes
+            if self._speech_frames and (
+                self._trailing_silence >= self.silence_frames or frames >= self.max_segment_frames
+            ):
+                segment = self._take_segment()
+                if segment:
+                    segments.append(segment)
+        return segments
+
+    def flush(self) -> Optional[bytes]:
+        """Return the utterance in progress, if any, at end of stream"""
+        self._pending = b""
+        return self._take_segment()
+
+    def _take_segment(self) -> Optional[bytes]:
+        segment = bytes(self._segment)
+        enough_speech = self._speech_frames >= self.min_speech_frames
+        self._segment = bytearray()
+        self._speech_frames = 0
+        self._trailing_silence = 0
+        return segment if enough_speech else None
+
+
+class WhisperTranscriber:
+    """Transcribes PCM utterances with OpenAI Whisper"""
+
+    def __init__(self, client_pool: Optional[ClientPool] = None):
+        self.client_pool = client_pool or clients
+
+    async def transcribe(self, pcm: bytes, sample_rate: int) -> str:
+        transcription = await self.client_pool.openai.audio.transcriptions.create(
+            model="whisper-1",
+            file=("utterance.wav", pcm16_to_wav(pcm, sample_rate))
+        )
+        return transcription.text
+
+
+class StubTranscriber:
+    """Local stand-in for testing the voice pipeline without calling Whisper"""
+
+    def __init__(self, text: str = ""):
+        self.text = text
+
+    async def transcribe(self, pcm: bytes, sample_rate: int) -> str:
+        if self.text:
+            return self.text
+        seconds = len(pcm) / 2 / sample_rate
+        return f"(stub transcript of {seconds:.1f}s of speech)"
+
+
+def create_transcriber(settings):
+    """Build the transcriber selected by settings.voice_transcriber"""
+    if settings.voice_transcriber == "stub":
+        return StubTranscriber(settings.voice_stub_text)
+    if settings.voice_transcriber == "whisper":
+        return WhisperTranscriber(clients)
+    raise ValueError(f"Unknown voice transcriber: {settings.voice_transcriber}")
@@ -0,0 +1,132 @@
+"""Local stand-in for OpenAI and the TTS server, for offline benchmarks.
+
+Serves the OpenAI routes the app uses (chat completions with and without
+streaming, speech and transcriptions) under /v1, plus the local TTS server's
+/synthesize. Latencies are set through environment variables:
+
+    FAKE_LLM_LATENCY       seconds before the first token (default 0.3)
+    FAKE_TOKEN_INTERVAL    seconds between streamed tokens (default 0.02)
+    FAKE_REPLY_WORDS       words per reply (default 40)
+    FAKE_TTS_LATENCY       seconds per synthesis (default 0.1)
+    FAKE_TTS_FAIL_RATE     fraction of /synthesize calls answered with 503 (default 0)
+    FAKE_STT_LATENCY       seconds per transcription (default 0.2)
+
+Run with: uvicorn bench.fake_upstream:app --port 8100
+"""
+import io
+import os
+import json
+import time
+import wave
+import random
+import asyncio
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+
+LLM_LATENCY = float(os.getenv("FAKE_LLM_LATENCY", "0.3"))
+TOKEN_INTERVAL = float(os.getenv("FAKE_TOKEN_INTERVAL", "0.02"))
+REPLY_WORDS = int(os.getenv("FAKE_REPLY_WORDS", "40"))
+TTS_LATENCY = float(os.getenv("FAKE_TTS_LATENCY", "0.1"))
+TTS_FAIL_RATE = float(os.getenv("FAKE_TTS_FAIL_RATE", "0"))
+STT_LATENCY = float(os.getenv("FAKE_STT_LATENCY", "0.2"))
+
+WORDS = "that sounds interesting but I would like to understand the pricing and the support terms first".split()
+
+app = FastAPI(title="Fake OpenAI and TTS upstream")
+
+
+def reply_tokens(seed: str):
+    """Deterministic reply for a prompt, as a list of word tokens"""
+    rng = random.Random(seed)
+    return [("" if i == 0 else " ") + rng.choice(WORDS) for i in range(REPLY_WORDS)] + ["."]
+
+
+def silence_wav(seconds: float, sample_rate: int = 16000) -> bytes:
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(b"\0\0" * int(seconds * sample_rate))
+    return buffer.getvalue()
+
+
+@app.get("/")
+async def health():
+    return {"status": "ok"}
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    tokens = reply_tokens(json.dumps(body["messages"][-1:]))
+    usage = {
+        "prompt_tokens": sum(len(m["content"]) // 4 + 4 for m in body["messages"]),
+        "completion_tokens": len(tokens),
+        "total_tokens": 0
+    }
+    usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+    base = {"id": "chatcmpl-fake", "created": int(time.time()), "model": body.get("model", "fake")}
+
+    if body.get("response_format", {}).get("type") == "json_object":
+        tokens = [json.dumps({
+            "strengths": ["Clear opening"],
+            "weaknesses": ["Few discovery questions"],
+            "key_moments": ["Pricing question"],
+            "improvement_suggestions": ["Ask about budget earlier"],
+            "role_specific_feedback": "Good pace overall."
+        })]
+
+    if not body.get("stream"):
+        await asyncio.sleep(LLM_LATENCY + TOKEN_INTERVAL * len(tokens))
+        return {
+            **base,
+            "object": "chat.completion",
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": "".join(tokens)},
+                "finish_reason": "stop"
+            }],
+            "usage": usage
+        }
+
+    async def events():
+        await asyncio.sleep(LLM_LATENCY)
+        for token in tokens:
+            chunk = {**base, "object": "chat.completion.chunk",
+                     "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}]}
+            yield f"data: {json.dumps(chunk)}\n\n"
+            await asyncio.sleep(TOKEN_INTERVAL)
+        done = {**base, "object": "chat.completion.chunk",
+                "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}
+        yield f"data: {json.dumps(done)}\n\n"
+        if body.get("stream_options", {}).get("include_usage"):
+            yield f"data: {json.dumps({**base, 'object': 'chat.completion.chunk', 'choices': [], 'usage': usage})}\n\n"
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+@app.post("/v1/audio/speech")
+async def speech(request: Request):
+    body = await request.json()
+    await asyncio.sleep(TTS_LATENCY)
+    # Roughly the size of a 64 kbit/s MP3 of the text read aloud
+    return Response(b"ID3" + b"\0" * (len(body["input"]) * 500), media_type="audio/mpeg")
+
+
+@app.post("/v1/audio/transcriptions")
+async def transcriptions(request: Request):
+    await request.form()
+    await asyncio.sleep(STT_LATENCY)
+    return {"text": "Could you tell me more about the pricing?"}
+
+
+@app.post("/synthesize")
+async def synthesize(request: Request):
+    body = await request.json()
+    await asyncio.sleep(TTS_LATENCY)
+    if TTS_FAIL_RATE and random.random() < TTS_FAIL_RATE:
+        return JSONResponse(status_code=503, content={"error": "overloaded"})
+    return Response(silence_wav(min(len(body["text"]) / 15, 30)), media_type="audio/wav")
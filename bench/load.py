@@ -0,0 +1,394 @@
+"""Offline load test for the app against the fake upstream in bench/fake_upstream.py.
+
+By default this starts the fake upstream and the app as local uvicorn
+processes, runs every scenario and prints a report:
+
+    python -m bench.load --concurrency 20 --requests 200
+    python -m bench.load --scenarios send-message,ws --concurrency 50
+    python -m bench.load --target http://127.0.0.1:8000 --app-pid 1234
+
+Scenarios are send-message, stream, ws, tts and stt. While a scenario runs, a
+probe polls a trivial endpoint; if its latency climbs with load, something is
+blocking the event loop. Memory per session is the growth in the app's
+resident memory after creating --sessions conversations.
+
+The ws scenario needs the websockets package (see bench/requirements.txt).
+"""
+import io
+import os
+import sys
+import math
+import json
+import time
+import wave
+import shutil
+import asyncio
+import argparse
+import tempfile
+import subprocess
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import httpx
+
+try:
+    import websockets
+except ImportError:  # The ws scenario is skipped without it
+    websockets = None
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCENARIOS = ("send-message", "stream", "ws", "tts", "stt")
+
+CONVERSATION = {"system_role": "sales specialist", "assistant_role": "customer", "scenario": "product_pitch"}
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return float("nan")
+    rank = max(math.ceil(pct / 100 * len(sorted_values)) - 1, 0)
+    return sorted_values[rank]
+
+
+def rss_bytes(pid: int) -> Optional[int]:
+    """Resident memory of a process, from /proc or psutil when available"""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        import psutil
+        return psutil.Process(pid).memory_info().rss
+    except Exception:
+        return None
+
+
+def speech_wav(seconds: float = 2.0, sample_rate: int = 16000) -> bytes:
+    """A short PCM16 WAV clip to upload to the STT route"""
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(b"\x10\x00\xf0\xff" * int(seconds * sample_rate / 2))
+    return buffer.getvalue()
+
+
+class Result:
+    """Latencies and errors collected for one scenario"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.latencies: List[float] = []
+        self.errors = 0
+        self.error_samples: List[str] = []
+        self.duration = 0.0
+        self.probe_latencies: List[float] = []
+
+    def error(self, message: str):
+        self.errors += 1
+        if len(self.error_samples) < 3:
+            self.error_samples.append(message[:200])
+
+    def summary(self) -> Dict[str, float]:
+        latencies = sorted(self.latencies)
+        probes = sorted(self.probe_latencies)
+        return {
+            "requests": len(latencies),
+            "errors": self.errors,
+            "throughput_rps": len(latencies) / self.duration if self.duration else 0.0,
+            "p50_ms": percentile(latencies, 50) * 1000,
+            "p95_ms": percentile(latencies, 95) * 1000,
+            "p99_ms": percentile(latencies, 99) * 1000,
+            "probe_p99_ms": percentile(probes, 99) * 1000
+        }
+
+
+class LoadTest:
+    """Drives one scenario at a fixed concurrency and records per-request latency"""
+
+    def __init__(self, base_url: str, concurrency: int, requests: int):
+        self.base_url = base_url.rstrip("/")
+        self.concurrency = concurrency
+        self.requests = requests
+        self.client = httpx.AsyncClient(
+            base_url=self.base_url,
+            timeout=120,
+            limits=httpx.Limits(max_connections=concurrency + 2, max_keepalive_connections=concurrency + 2)
+        )
+        self.wav = speech_wav()
+
+    async def start_session(self) -> str:
+        response = await self.client.post("/api/start-conversation", json=CONVERSATION)
+        response.raise_for_status()
+        return response.json()["session_id"]
+
+    async def run(self, name: str) -> Result:
+        result = Result(name)
+        worker = getattr(self, "worker_" + name.replace("-", "_"))
+        counter = iter(range(self.requests))
+        stop_probe = asyncio.Event()
+        probe = asyncio.create_task(self.probe(result, stop_probe))
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(w, counter, result) for w in range(self.concurrency)))
+        result.duration = time.perf_counter() - started
+        stop_probe.set()
+        await probe
+        return result
+
+    async def probe(self, result: Result, stop: asyncio.Event):
+        """Poll a trivial endpoint; its latency under load exposes event-loop blocking"""
+        while not stop.is_set():
+            started = time.perf_counter()
+            try:
+                await self.client.get("/api/client-stats")
+                result.probe_latencies.append(time.perf_counter() - started)
+            except httpx.HTTPError:
+                pass
+            try:
+                await asyncio.wait_for(stop.wait(), 0.05)
+            except asyncio.TimeoutError:
+                pass
+
+    async def timed(self, result: Result, call: Callable[[], Awaitable[Optional[str]]]):
+        """Time one request; call returns an error message or None"""
+        started = time.perf_counter()
+        try:
+            error = await call()
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        if error:
+            result.error(error)
+        else:
+            result.latencies.append(time.perf_counter() - started)
+
+    @staticmethod
+    def check(response: httpx.Response) -> Optional[str]:
+        if response.status_code != 200:
+            return f"HTTP {response.status_code}: {response.text}"
+        if response.headers.get("content-type", "").startswith("application/json"):
+            body = response.json()
+            if body.get("status") == "error":
+                return body.get("message", "error")
+            if str(body.get("response", "")).startswith("Error:"):
+                return body["response"]
+        return None
+
+    async def worker_send_message(self, w: int, counter, result: Result):
+        session_id = await self.start_session()
+        headers = {"X-Session-ID": session_id}
+        for i in counter:
+            async def call():
+                response = await self.client.post(
+                    "/api/send-message", json={"content": f"Worker {w} question {i}"}, headers=headers
+                )
+                return self.check(response)
+            await self.timed(result, call)
+
+    async def worker_stream(self, w: int, counter, result: Result):
+        session_id = await self.start_session()
+        headers = {"X-Session-ID": session_id}
+        for i in counter:
+            async def call():
+                async with self.client.stream(
+                    "POST", "/api/send-message/stream", json={"content": f"Worker {w} question {i}"}, headers=headers
+                ) as response:
+                    if response.status_code != 200:
+                        return f"HTTP {response.status_code}"
+                    body = "".join([text async for text in response.aiter_text()])
+                return None if "event: done" in body else "stream ended without a done event"
+            await self.timed(result, call)
+
+    async def worker_ws(self, w: int, counter, result: Result):
+        session_id = await self.start_session()
+        url = self.base_url.replace("http", "ws", 1) + f"/ws?session_id={session_id}"
+        async with websockets.connect(url, max_size=None) as ws:
+            for i in counter:
+                async def call():
+                    await ws.send(json.dumps({"action": "message", "content": f"Worker {w} question {i}", "stream": True}))
+                    while True:
+                        frame = json.loads(await ws.recv())
+                        if frame["type"] == "response":
+                            return None
+                        if frame["type"] == "error":
+                            return frame.get("message", "error")
+                await self.timed(result, call)
+
+    async def worker_tts(self, w: int, counter, result: Result):
+        for i in counter:
+            async def call():
+                # Unique text per request so the audio cache does not hide upstream latency
+                response = await self.client.post(
+                    "/api/text-to-speech", json={"text": f"Worker {w} sentence number {i} for synthesis."}
+                )
+                return self.check(response)
+            await self.timed(result, call)
+
+    async def worker_stt(self, w: int, counter, result: Result):
+        for i in counter:
+            async def call():
+                # Vary the payload so identical uploads are not coalesced
+                audio = self.wav + f"{w}-{i}".encode()
+                response = await self.client.post(
+                    "/api/speech-to-text", files={"file": ("speech.wav", audio, "audio/wav")}
+                )
+                return self.check(response)
+            await self.timed(result, call)
+
+    async def memory_per_session(self, pid: int, sessions: int, turns: int) -> Optional[float]:
+        """Resident memory growth per session after creating sessions with a few turns each"""
+        before = rss_bytes(pid)
+        if before is None:
+            return None
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def one_session(n: int):
+            async with semaphore:
+                session_id = await self.start_session()
+                for turn in range(turns):
+                    await self.client.post(
+                        "/api/send-message",
+                        json={"content": f"Session {n} turn {turn}"},
+                        headers={"X-Session-ID": session_id}
+                    )
+
+        await asyncio.gather(*(one_session(n) for n in range(sessions)))
+        after = rss_bytes(pid)
+        return (after - before) / sessions if after is not None else None
+
+    async def close(self):
+        await self.client.aclose()
+
+
+def spawn(module: str, port: int, env: Dict[str, str]) -> subprocess.Popen:
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", module, "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=REPO_ROOT,
+        env={**os.environ, **env}
+    )
+
+
+async def wait_ready(url: str, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            try:
+                await client.get(url)
+                return
+            except httpx.HTTPError:
+                await asyncio.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up within {timeout:g}s")
+
+
+def print_report(results: List[Result], memory: Optional[float], args):
+    print(f"\nconcurrency={args.concurrency} requests/scenario={args.requests}")
+    header = f"{'scenario':<14}{'ok':>6}{'err':>5}{'rps':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'probe p99':>11}"
+    print(header)
+    print("-" * len(header))
+    for result in results:
+        s = result.summary()
+        print(
+            f"{result.name:<14}{s['requests']:>6}{s['errors']:>5}{s['throughput_rps']:>9.1f}"
+            f"{s['p50_ms']:>9.1f}{s['p95_ms']:>9.1f}{s['p99_ms']:>9.1f}{s['probe_p99_ms']:>11.1f}"
+        )
+        for sample in result.error_samples:
+            print(f"    error: {sample}")
+    if memory is not None:
+        print(f"\nmemory per session: {memory / 1024:.1f} KiB ({args.sessions} sessions, {args.session_turns} turns each)")
+
+
+async def main(args) -> int:
+    processes = []
+    temp_dir = None
+    app_pid = args.app_pid
+    base_url = args.target
+    try:
+        if not base_url:
+            temp_dir = tempfile.mkdtemp(prefix="bench-")
+            upstream = f"http://127.0.0.1:{args.upstream_port}"
+            processes.append(spawn("bench.fake_upstream:app", args.upstream_port, {
+                "FAKE_LLM_LATENCY": str(args.llm_latency),
+                "FAKE_TOKEN_INTERVAL": str(args.token_interval),
+                "FAKE_TTS_LATENCY": str(args.tts_latency),
+                "FAKE_STT_LATENCY": str(args.stt_latency)
+            }))
+            app_process = spawn("app.main:app", args.port, {
+                "OPENAI_API_KEY": "bench",
+                "OPENAI_BASE_URL": upstream + "/v1",
+                "TTS_SERVER_URLS": upstream,
+                "TTS_CACHE_DIR": os.path.join(temp_dir, "tts_cache"),
+                "SESSION_DB_PATH": os.path.join(temp_dir, "sessions.db"),
+                "SESSION_MAX_SESSIONS": str(max(args.sessions * 2, 5000)),
+                "RESPONSE_CACHE_ENABLED": "false",
+                "TTS_WARMUP": "false"
+            })
+            processes.append(app_process)
+            app_pid = app_process.pid
+            base_url = f"http://127.0.0.1:{args.port}"
+            await wait_ready(upstream + "/")
+            await wait_ready(base_url + "/api/client-stats")
+
+        load = LoadTest(base_url, args.concurrency, args.requests)
+        results = []
+        for name in args.scenarios.split(","):
+            name = name.strip()
+            if name not in SCENARIOS:
+                print(f"Unknown scenario '{name}'. Expected one of: {', '.join(SCENARIOS)}")
+                return 2
+            if name == "ws" and websockets is None:
+                print("Skipping ws: install the websockets package")
+                continue
+            print(f"running {name}...", flush=True)
+            results.append(await load.run(name))
+
+        memory = None
+        if app_pid and args.sessions:
+            print("measuring memory per session...", flush=True)
+            memory = await load.memory_per_session(app_pid, args.sessions, args.session_turns)
+        await load.close()
+
+        print_report(results, memory, args)
+        if args.json:
+            with open(args.json, "w") as f:
+                json.dump({
+                    "concurrency": args.concurrency,
+                    "scenarios": {result.name: result.summary() for result in results},
+                    "memory_per_session_bytes": memory
+                }, f, indent=2)
+        return 1 if any(result.errors for result in results) else 0
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        if temp_dir:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Offline load test against a fake OpenAI and TTS upstream")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="comma-separated: " + ", ".join(SCENARIOS))
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--requests", type=int, default=100, help="requests per scenario")
+    parser.add_argument("--target", help="benchmark an already running app instead of starting one")
+    parser.add_argument("--app-pid", type=int, help="process ID of --target, for memory measurement")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--upstream-port", type=int, default=8766)
+    parser.add_argument("--llm-latency", type=float, default=0.3)
+    parser.add_argument("--token-interval", type=float, default=0.02)
+    parser.add_argument("--tts-latency", type=float, default=0.1)
+    parser.add_argument("--stt-latency", type=float, default=0.2)
+    parser.add_argument("--sessions", type=int, default=200, help="sessions created for the memory measurement; 0 skips it")
+    parser.add_argument("--session-turns", type=int, default=4)
+    parser.add_argument("--json", help="also write the results to this file")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main(parse_args())))
@@ -9,13 +9,82 @@ class Settings(BaseSettings):
     """Application settings"""
     app_name: str = "Sales Conversation Training Assistant"
     openai_api_key: str = os.getenv("OPENAI_API_KEY", "")
+    # Optional OpenAI-compatible endpoint, e.g. the fake server in bench/
+    openai_base_url: str = os.getenv("OPENAI_BASE_URL", "")
     tts_server_url: str = os.getenv("TTS_SERVER_URL", "http://localhost:5000")
+    # Comma-separated local TTS servers; defaults to the single TTS_SERVER_URL
+    tts_server_urls: str = os.getenv("TTS_SERVER_URLS", os.getenv("TTS_SERVER_URL", "http://localhost:5000"))
     
-    # Available scenarios
-    scenarios: list = ["product_pitch", "objection_handling", "negotiation", "upselling"]
+    # Role and scenario prompts; new scenarios can be added there without code changes
+    prompts_path: str = os.getenv(
+        "PROMPTS_PATH", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app", "prompts.json")
+    )
     
-    # Available roles
-    roles: list = ["sales specialist", "customer"]
+    # Model calls
+    openai_model: str = os.getenv("OPENAI_MODEL", "gpt-4-turbo")
+    llm_max_concurrency: int = int(os.getenv("LLM_MAX_CONCURRENCY", "32"))
+    llm_timeout_seconds: float = float(os.getenv("LLM_TIMEOUT_SECONDS", "60"))
+    
+    # Prompt window: turns beyond the budget are folded into a running summary. Tokens are counted
+    # with tiktoken when it is installed; otherwise the budget is an estimate of about 4 characters per token
+    context_token_budget: int = int(os.getenv("CONTEXT_TOKEN_BUDGET", "3000"))
+    context_keep_recent_messages: int = int(os.getenv("CONTEXT_KEEP_RECENT_MESSAGES", "6"))
+    summary_max_tokens: int = int(os.getenv("SUMMARY_MAX_TOKENS", "300"))
+    
+    # Opt-in cache of model replies for scripted openings and replayed drills
+    response_cache_enabled: bool = os.getenv("RESPONSE_CACHE_ENABLED", "false").lower() in ("1", "true", "yes")
+    response_cache_path: str = os.getenv("RESPONSE_CACHE_PATH", "response_cache.db")
+    response_cache_max_entries: int = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "10000"))
+    response_cache_ttl_seconds: float = float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "86400"))
+    response_cache_max_user_turns: int = int(os.getenv("RESPONSE_CACHE_MAX_USER_TURNS", "4"))
+    
+    # Conversation analysis: transcripts are analyzed in cached segments of this many messages
+    analysis_segment_messages: int = int(os.getenv("ANALYSIS_SEGMENT_MESSAGES", "20"))
+    
+    # Shared HTTP connection pools
+    http_max_connections: int = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+    http_max_keepalive_connections: int = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "20"))
+    http_keepalive_expiry: float = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+    tts_timeout_seconds: float = float(os.getenv("TTS_TIMEOUT_SECONDS", "5"))
+    
+    # Local TTS routing: a backend's circuit opens after consecutive failures and is re-probed in the background
+    tts_failure_threshold: int = int(os.getenv("TTS_FAILURE_THRESHOLD", "3"))
+    tts_circuit_reset_seconds: float = float(os.getenv("TTS_CIRCUIT_RESET_SECONDS", "30"))
+    tts_probe_interval_seconds: float = float(os.getenv("TTS_PROBE_INTERVAL_SECONDS", "10"))
+    # Voices used when a request asks for "default"
+    tts_local_voice: str = os.getenv("TTS_LOCAL_VOICE", "af_heart")
+    tts_openai_voice: str = os.getenv("TTS_OPENAI_VOICE", "nova")
+    
+    # Synthesized audio cache
+    tts_cache_dir: str = os.getenv("TTS_CACHE_DIR", ".tts_cache")
+    tts_cache_memory_bytes: int = int(os.getenv("TTS_CACHE_MEMORY_BYTES", str(32 * 1024 * 1024)))
+    tts_cache_disk_bytes: int = int(os.getenv("TTS_CACHE_DISK_BYTES", str(512 * 1024 * 1024)))
+    tts_warmup: bool = os.getenv("TTS_WARMUP", "false").lower() in ("1", "true", "yes")
+    
+    # Speech-to-text uploads (Whisper accepts up to 25 MB)
+    stt_max_upload_bytes: int = int(os.getenv("STT_MAX_UPLOAD_BYTES", str(25 * 1024 * 1024)))
+    
+    # Streaming voice mode over /ws ("whisper", or "stub" for local testing)
+    voice_transcriber: str = os.getenv("VOICE_TRANSCRIBER", "whisper")
+    voice_stub_text: str = os.getenv("VOICE_STUB_TEXT", "")
+    voice_vad_threshold: float = float(os.getenv("VOICE_VAD_THRESHOLD", "500"))
+    voice_silence_ms: int = int(os.getenv("VOICE_SILENCE_MS", "600"))
+    
+    # Instrumentation: stage timings are always collected for /metrics; this also adds a Server-Timing header
+    server_timing_enabled: bool = os.getenv("SERVER_TIMING_ENABLED", "false").lower() in ("1", "true", "yes")
+    
+    # Session storage ("memory" or "sqlite")
+    session_backend: str = os.getenv("SESSION_BACKEND", "memory")
+    session_db_path: str = os.getenv("SESSION_DB_PATH", "sessions.db")
+    session_ttl_seconds: float = float(os.getenv("SESSION_TTL_SECONDS", "3600"))
+    session_max_sessions: int = int(os.getenv("SESSION_MAX_SESSIONS", "5000"))
+    # How long a worker waits for another process's SQLite write lock
+    sqlite_busy_timeout_seconds: float = float(os.getenv("SQLITE_BUSY_TIMEOUT_SECONDS", "5"))
+    
+    # Production launcher (python -m app.server); more than one worker requires the sqlite session backend
+    server_host: str = os.getenv("SERVER_HOST", "0.0.0.0")
+    server_port: int = int(os.getenv("SERVER_PORT", "8000"))
+    server_workers: int = int(os.getenv("WEB_CONCURRENCY", str(os.cpu_count() or 1)))
     
     class Config:
         env_file = ".env"
@@ -4,9 +4,12 @@ class ConversationManager {
         this.messageInput = document.getElementById('message-input');
         this.sendButton = document.getElementById('send-button');
         this.micButton = document.getElementById('mic-button');
+        this.voiceButton = document.getElementById('voice-button');
         
         this.typingAnimator = new TypingAnimator();
         this.speechManager = new SpeechManager();
+        this.voiceStream = null;
+        this.voiceReply = null;
         
         this.setupEventListeners();
     }
@@ -25,6 +28,49 @@ class ConversationManager {
         
         // Microphone button for speech input
         this.micButton.addEventListener('click', () => this.startSpeechRecognition());
+        
+        // Headset button toggles live voice mode
+        this.voiceButton.addEventListener('click', () => this.toggleVoiceMode());
+    }
+    
+    async toggleVoiceMode() {
+        if (this.voiceStream && this.voiceStream.isActive) {
+            this.voiceStream.stop();
+            this.voiceButton.classList.remove('active');
+            return;
+        }
+        
+        if (!Session.id) {
+            this.addSystemMessage('Start a conversation before using voice mode.');
+            return;
+        }
+        
+        if (!this.voiceStream) {
+            this.voiceStream = new VoiceStream({
+                transcript: (data) => this.addUserMessage(data.content),
+                delta: (data) => {
+                    if (!this.voiceReply) {
+                        this.voiceReply = this.addStreamingAssistantMessage();
+                    }
+                    this.voiceReply.push(data.content);
+                },
+                response: () => {
+                    if (this.voiceReply) {
+                        this.voiceReply.end();
+                        this.voiceReply = null;
+                    }
+                },
+                error: (data) => this.addSystemMessage(`Error: ${data.message}`)
+            });
+        }
+        
+        try {
+            await this.voiceStream.start();
+            this.voiceButton.classList.add('active');
+        } catch (error) {
+            console.error('Voice mode error:', error);
+            this.addSystemMessage(`Voice mode error: ${error.message}`);
+        }
     }
     
     async sendMessage() {
@@ -37,30 +83,41 @@ class ConversationManager {
         // Add user message to UI
         this.addUserMessage(message);
         
-        // Get AI response
+        // Stream the AI response
         try {
-            const response = await fetch('/api/send-message', {
+            const response = await fetch('/api/send-message/stream', {
                 method: 'POST',
-                headers: {
+                headers: Session.headers({
                     'Content-Type': 'application/json'
-                },
+                }),
                 body: JSON.stringify({
                     content: message
                 })
             });
             
-            const data = await response.json();
+            if (!response.ok) {
+                const data = await response.json();
+                throw new Error(data.message || 'Failed to get response');
+            }
             
-            if (data.status === 'success') {
-                // Add AI response with typing animation
-                this.addAssistantMessage(data.response, true);
-                
-                // Check if TTS is enabled and speak the response
-                if (document.getElementById('tts-toggle').checked) {
-                    this.speechManager.speakText(data.response);
+            // Type deltas into the message as they arrive
+            const stream = this.addStreamingAssistantMessage();
+            let fullResponse = '';
+            
+            await this.readEventStream(response, (event, data) => {
+                if (event === 'delta') {
+                    stream.push(data.content);
+                } else if (event === 'done') {
+                    fullResponse = data.response;
+                } else if (event === 'error') {
+                    this.addSystemMessage(`Error: ${data.message}`);
                 }
-            } else {
-                throw new Error(data.message || 'Failed to get response');
+            });
+            stream.end();
+            
+            // Check if TTS is enabled and speak the response
+            if (fullResponse && document.getElementById('tts-toggle').checked) {
+                this.speechManager.speakText(fullResponse);
             }
         } catch (error) {
             console.error('Error sending message:', error);
@@ -68,6 +125,45 @@ class ConversationManager {
         }
     }
     
+    /**
+     * Read a server-sent event stream from a fetch response
+     * @param {Response} response - Response with a text/event-stream body
+     * @param {Function} onEvent - Called with (eventName, parsedData) for each event
+     */
+    async readEventStream(response, onEvent) {
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            
+            buffer += decoder.decode(value, { stream: true });
+            
+            // Events are separated by a blank line
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                const rawEvent = buffer.slice(0, boundary);
+                buffer = buffer.slice(boundary + 2);
+                
+                let eventName = 'message';
+                let data = '';
+                rawEvent.split('\n').forEach(line => {
+                    if (line.startsWith('event: ')) {
+                        eventName = line.slice(7);
+                    } else if (line.startsWith('data: ')) {
+                        data += line.slice(6);
+                    }
+                });
+                
+                if (data) {
+                    onEvent(eventName, JSON.parse(data));
+                }
+            }
+        }
+    }
+    
     addUserMessage(message) {
         const messageElement = document.createElement('div');
         messageElement.className = 'message user-message';
@@ -126,6 +222,53 @@ class ConversationManager {
         }
     }
     
+    addStreamingAssistantMessage() {
+        const messageElement = document.createElement('div');
+        messageElement.className = 'message assistant-message';
+        
+        const headerElement = document.createElement('div');
+        headerElement.className = 'message-header';
+        headerElement.textContent = 'Assistant';
+        
+        const contentElement = document.createElement('div');
+        contentElement.className = 'message-content';
+        
+        // Show the typing indicator until the first delta arrives
+        const typingIndicator = document.createElement('div');
+        typingIndicator.className = 'typing-indicator';
+        for (let i = 0; i < 3; i++) {
+            const dot = document.createElement('span');
+            typingIndicator.appendChild(dot);
+        }
+        headerElement.appendChild(typingIndicator);
+        
+        messageElement.appendChild(headerElement);
+        messageElement.appendChild(contentElement);
+        
+        this.conversationBox.appendChild(messageElement);
+        this.scrollToBottom();
+        
+        const stream = this.typingAnimator.createStream(contentElement, () => {
+            this.scrollToBottom();
+        });
+        
+        return {
+            push: (text) => {
+                if (typingIndicator.parentNode) {
+                    headerElement.removeChild(typingIndicator);
+                }
+                stream.push(text);
+                this.scrollToBottom();
+            },
+            end: () => {
+                if (typingIndicator.parentNode) {
+                    headerElement.removeChild(typingIndicator);
+                }
+                stream.end();
+            }
+        };
+    }
+    
     addSystemMessage(message) {
         const messageElement = document.createElement('div');
         messageElement.className = 'message system-message';
@@ -80,9 +80,9 @@ document.addEventListener('DOMContentLoaded', function() {
         try {
             const response = await fetch('/api/start-conversation', {
                 method: 'POST',
-                headers: {
+                headers: Session.headers({
                     'Content-Type': 'application/json'
-                },
+                }),
                 body: JSON.stringify({
                     system_role: state.systemRole,
                     scenario: state.scenario
@@ -92,6 +92,7 @@ document.addEventListener('DOMContentLoaded', function() {
             const data = await response.json();
             
             if (data.status === 'success') {
+                Session.id = data.session_id;
                 state.systemRole = data.system_role;
                 state.assistantRole = data.assistant_role;
                 state.conversationStarted = true;
@@ -134,7 +135,8 @@ document.addEventListener('DOMContentLoaded', function() {
         
         try {
             const response = await fetch('/api/switch-roles', {
-                method: 'POST'
+                method: 'POST',
+                headers: Session.headers()
             });
             
             const data = await response.json();
@@ -170,15 +172,29 @@ document.addEventListener('DOMContentLoaded', function() {
         try {
             const response = await fetch('/api/analyze-conversation', {
                 method: 'POST',
-                headers: {
+                headers: Session.headers({
                     'Content-Type': 'application/json'
-                },
+                }),
                 body: JSON.stringify({
                     include_suggestions: true
                 })
             });
             
-            const data = await response.json();
+            let data = await response.json();
+            
+            // Analysis runs as a background job; poll until it finishes
+            analyzeButton.disabled = true;
+            try {
+                while (data.status === 'pending' || data.status === 'running') {
+                    await new Promise(resolve => setTimeout(resolve, 1000));
+                    const poll = await fetch(`/api/analysis/${data.job_id}`, {
+                        headers: Session.headers()
+                    });
+                    data = await poll.json();
+                }
+            } finally {
+                analyzeButton.disabled = false;
+            }
             
             if (data.status === 'success') {
                 // Display feedback in modal
@@ -199,7 +215,8 @@ document.addEventListener('DOMContentLoaded', function() {
         
         try {
             const response = await fetch('/api/reset-conversation', {
-                method: 'POST'
+                method: 'POST',
+                headers: Session.headers()
             });
             
             const data = await response.json();
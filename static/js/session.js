@@ -0,0 +1,17 @@
+// Holds the server-issued session ID and attaches it to API requests
+const Session = {
+    id: null,
+    
+    /**
+     * Build request headers including the current session ID
+     * @param {Object} extra - Additional headers to merge in
+     * @returns {Object} - Headers object for fetch()
+     */
+    headers(extra = {}) {
+        const headers = { ...extra };
+        if (this.id) {
+            headers['X-Session-ID'] = this.id;
+        }
+        return headers;
+    }
+};
@@ -100,25 +100,10 @@ class SpeechManager {
     
     async speakText(text) {
         try {
-            const response = await fetch('/api/text-to-speech', {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json'
-                },
-                body: JSON.stringify({
-                    text: text
-                })
-            });
-            
-            const data = await response.json();
-            
-            if (data.status === 'success') {
-                // Play the audio
-                const audio = new Audio(`data:audio/mp3;base64,${data.audio}`);
-                audio.play();
-            } else {
-                throw new Error(data.message || 'Text-to-speech failed');
-            }
+            // Stream the binary audio so playback starts before the whole clip arrives
+            const params = new URLSearchParams({ text: text });
+            const audio = new Audio(`/api/text-to-speech/stream?${params}`);
+            await audio.play();
         } catch (error) {
             console.error('Text-to-speech error:', error);
         }
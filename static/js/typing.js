@@ -47,6 +47,55 @@ class TypingAnimator {
         type();
     }
     
+    /**
+     * Create a typing stream that animates text as it arrives
+     * @param {HTMLElement} element - Element to insert text into
+     * @param {Function} callback - Optional callback when the stream has ended and finished typing
+     * @returns {Object} - Stream with push(text) and end() methods
+     */
+    createStream(element, callback = null) {
+        let pending = '';
+        let content = '';
+        let running = false;
+        let ended = false;
+        
+        // Clear the element first
+        element.textContent = '';
+        
+        const type = () => {
+            if (pending.length > 0) {
+                const char = pending.charAt(0);
+                pending = pending.slice(1);
+                content += char;
+                element.textContent = content;
+                
+                setTimeout(type, this.calculateDelay(char));
+            } else {
+                // Caught up with the stream; wait for more text or finish
+                running = false;
+                if (ended && callback) {
+                    callback();
+                }
+            }
+        };
+        
+        return {
+            push: (text) => {
+                pending += text;
+                if (!running) {
+                    running = true;
+                    type();
+                }
+            },
+            end: () => {
+                ended = true;
+                if (!running && callback) {
+                    callback();
+                }
+            }
+        };
+    }
+    
     /**
      * Calculate delay for a character based on punctuation and randomness
      * @param {string} char - The character to calculate delay for
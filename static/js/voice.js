@@ -0,0 +1,133 @@
+class VoiceStream {
+    /**
+     * Live voice mode over the /ws socket: streams microphone PCM to the server
+     * and plays back the spoken reply sentence by sentence.
+     * @param {Object} handlers - Callbacks keyed by server frame type (transcript, delta, response, error)
+     */
+    constructor(handlers = {}) {
+        this.handlers = handlers;
+        this.socket = null;
+        this.audioContext = null;
+        this.mediaStream = null;
+        this.processor = null;
+        this.isActive = false;
+        
+        // Playback state for incoming audio clips
+        this.audioChunks = [];
+        this.audioType = 'audio/mpeg';
+        this.playQueue = [];
+        this.isPlaying = false;
+    }
+    
+    async start() {
+        this.mediaStream = await navigator.mediaDevices.getUserMedia({ audio: true });
+        this.audioContext = new AudioContext();
+        
+        if (!this.socket || this.socket.readyState !== WebSocket.OPEN) {
+            await this.connect();
+        }
+        
+        // Tell the server our sample rate so it can cut utterances and build WAV segments
+        this.socket.send(JSON.stringify({
+            action: 'voice_start',
+            sample_rate: this.audioContext.sampleRate
+        }));
+        
+        const source = this.audioContext.createMediaStreamSource(this.mediaStream);
+        this.processor = this.audioContext.createScriptProcessor(4096, 1, 1);
+        this.processor.onaudioprocess = (event) => this.sendAudio(event.inputBuffer.getChannelData(0));
+        source.connect(this.processor);
+        this.processor.connect(this.audioContext.destination);
+        
+        this.isActive = true;
+    }
+    
+    stop() {
+        if (!this.isActive) return;
+        this.isActive = false;
+        
+        if (this.socket && this.socket.readyState === WebSocket.OPEN) {
+            this.socket.send(JSON.stringify({ action: 'voice_end' }));
+        }
+        
+        // Release the microphone; the socket stays open for the rest of the reply
+        this.processor.disconnect();
+        this.mediaStream.getTracks().forEach(track => track.stop());
+        this.audioContext.close();
+    }
+    
+    connect() {
+        const protocol = window.location.protocol === 'https:' ? 'wss' : 'ws';
+        const url = `${protocol}://${window.location.host}/ws?session_id=${encodeURIComponent(Session.id)}`;
+        
+        this.socket = new WebSocket(url);
+        this.socket.binaryType = 'arraybuffer';
+        this.socket.addEventListener('message', (event) => this.handleMessage(event));
+        
+        return new Promise((resolve, reject) => {
+            this.socket.addEventListener('open', resolve, { once: true });
+            this.socket.addEventListener('error', () => reject(new Error('Voice connection failed')), { once: true });
+        });
+    }
+    
+    /**
+     * Convert float samples to 16-bit PCM and send them as a binary frame
+     * @param {Float32Array} samples - Microphone samples in [-1, 1]
+     */
+    sendAudio(samples) {
+        if (!this.isActive || this.socket.readyState !== WebSocket.OPEN) return;
+        
+        const pcm = new Int16Array(samples.length);
+        for (let i = 0; i < samples.length; i++) {
+            const sample = Math.max(-1, Math.min(1, samples[i]));
+            pcm[i] = sample < 0 ? sample * 0x8000 : sample * 0x7fff;
+        }
+        this.socket.send(pcm.buffer);
+    }
+    
+    handleMessage(event) {
+        // Binary frames carry audio for the clip announced by the last audio_start
+        if (event.data instanceof ArrayBuffer) {
+            this.audioChunks.push(event.data);
+            return;
+        }
+        
+        const data = JSON.parse(event.data);
+        
+        if (data.type === 'audio_start') {
+            this.audioChunks = [];
+            this.audioType = data.media_type;
+        } else if (data.type === 'audio_end') {
+            this.enqueueAudio(new Blob(this.audioChunks, { type: this.audioType }));
+            this.audioChunks = [];
+        } else if (this.handlers[data.type]) {
+            this.handlers[data.type](data);
+        }
+    }
+    
+    enqueueAudio(blob) {
+        this.playQueue.push(blob);
+        if (!this.isPlaying) {
+            this.playNext();
+        }
+    }
+    
+    playNext() {
+        const blob = this.playQueue.shift();
+        if (!blob) {
+            this.isPlaying = false;
+            return;
+        }
+        
+        this.isPlaying = true;
+        const url = URL.createObjectURL(blob);
+        const audio = new Audio(url);
+        const next = () => {
+            URL.revokeObjectURL(url);
+            this.playNext();
+        };
+        audio.addEventListener('ended', next);
+        audio.addEventListener('error', next);
+        audio.play().catch(next);
+    }
+}
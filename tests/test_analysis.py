@@ -0,0 +1,78 @@
+import json
+
+from app.analysis import parse_feedback, repair_json
+
+FEEDBACK = {
+    "strengths": ["Clear opening"],
+    "weaknesses": ["Few discovery questions"],
+    "key_moments": ["Pricing question"],
+    "improvement_suggestions": ["Ask about budget earlier"],
+    "role_specific_feedback": "Good pace overall."
+}
+
+
+def test_repair_json_strips_a_code_fence():
+    text = "```json\n" + json.dumps(FEEDBACK) + "\n```"
+    assert repair_json(text) == FEEDBACK
+
+
+def test_repair_json_skips_a_prose_prefix_and_suffix():
+    text = "Here is the analysis:\n" + json.dumps(FEEDBACK) + "\nLet me know if you need more."
+    assert repair_json(text) == FEEDBACK
+
+
+def test_repair_json_closes_a_truncated_string():
+    text = '{"strengths": ["Clear opening"], "role_specific_feedback": "Good pa'
+    assert repair_json(text) == {"strengths": ["Clear opening"], "role_specific_feedback": "Good pa"}
+
+
+def test_repair_json_backs_off_to_the_last_complete_element():
+    text = '{"strengths": ["Clear opening", "Rapport"], "weaknesses": ["Few questions"], "key_moments": ["Pri'
+    repaired = repair_json(text)
+    assert repaired["strengths"] == ["Clear opening", "Rapport"]
+    assert repaired["weaknesses"] == ["Few questions"]
+
+
+def test_repair_json_recovers_a_fenced_truncated_object():
+    text = "```json\n" + '{"strengths": ["Clear opening"], "weaknesses": ['
+    assert repair_json(text) == {"strengths": ["Clear opening"], "weaknesses": []}
+
+
+def test_repair_json_without_an_object_is_none():
+    assert repair_json("I could not analyze this conversation.") is None
+    assert repair_json('["not", "an", "object"]') is None
+
+
+def test_parse_feedback_accepts_valid_json():
+    assert parse_feedback(json.dumps(FEEDBACK)) == FEEDBACK
+
+
+def test_parse_feedback_repairs_fenced_output():
+    assert parse_feedback("```json\n" + json.dumps(FEEDBACK) + "\n```") == FEEDBACK
+
+
+def test_parse_feedback_repairs_truncated_output():
+    text = json.dumps(FEEDBACK)[:-30]
+    feedback = parse_feedback(text)
+    assert "error" not in feedback
+    assert feedback["strengths"] == FEEDBACK["strengths"]
+
+
+def test_parse_feedback_normalizes_keys_and_values():
+    text = json.dumps({"Strengths": "Clear opening", "Key Moments": ["Pricing"], "role-specific feedback": "Fine."})
+    assert parse_feedback(text) == {
+        "strengths": ["Clear opening"],
+        "weaknesses": [],
+        "key_moments": ["Pricing"],
+        "role_specific_feedback": "Fine."
+    }
+
+
+def test_parse_feedback_drops_suggestions_when_not_requested():
+    assert "improvement_suggestions" not in parse_feedback(json.dumps(FEEDBACK), include_suggestions=False)
+
+
+def test_parse_feedback_reports_unusable_output():
+    assert "error" in parse_feedback("no json here")
+    assert "error" in parse_feedback(json.dumps({"summary": "unrelated"}))
+    assert "error" in parse_feedback(json.dumps({"strengths": {"nested": "object"}}))
@@ -0,0 +1,164 @@
+import sqlite3
+import threading
+
+import pytest
+
+from app.conversation import ConversationManager
+from app.sessions import InMemorySessionStore, SQLiteSessionStore, SessionConflict
+
+
+def manager_with(*messages):
+    manager = ConversationManager()
+    manager.scenario = "negotiation"
+    for content in messages:
+        manager.history.append({"role": "user", "content": content})
+    return manager
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "sessions.db")
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Controllable replacement for the monotonic clock the in-memory store reads"""
+    now = [1000.0]
+    monkeypatch.setattr("app.sessions.time.monotonic", lambda: now[0])
+    return now
+
+
+def test_memory_store_expires_idle_sessions(clock):
+    store = InMemorySessionStore(ttl_seconds=60)
+    manager = manager_with("hello")
+    store.save("s1", manager)
+    clock[0] += 59
+    assert store.get("s1") is manager
+    # Reading refreshes the idle timer
+    clock[0] += 59
+    assert store.get("s1") is manager
+    clock[0] += 61
+    assert store.get("s1") is None
+    assert len(store) == 0
+
+
+def test_memory_store_evicts_the_least_recently_used_session(clock):
+    store = InMemorySessionStore(max_sessions=2)
+    store.save("a", manager_with())
+    store.save("b", manager_with())
+    clock[0] += 1
+    store.get("a")
+    store.save("c", manager_with())
+    assert store.get("b") is None
+    assert store.get("a") is not None
+    assert store.get("c") is not None
+    assert len(store) == 2
+
+
+def test_memory_store_sweeps_expired_sessions_on_save(clock):
+    store = InMemorySessionStore(ttl_seconds=60)
+    store.save("old", manager_with())
+    clock[0] += 120
+    store.save("new", manager_with())
+    assert len(store) == 1
+
+
+def test_memory_store_delete(clock):
+    store = InMemorySessionStore()
+    store.save("s1", manager_with())
+    store.delete("s1")
+    store.delete("missing")
+    assert store.get("s1") is None
+
+
+def test_sqlite_round_trip_bumps_the_version(db_path):
+    store = SQLiteSessionStore(db_path)
+    manager = manager_with("hello")
+    store.save("s1", manager)
+    assert manager.version == 1
+
+    loaded = store.get("s1")
+    assert loaded.version == 1
+    assert loaded.conversation_history == manager.conversation_history
+    store.save("s1", loaded)
+    assert loaded.version == 2
+    assert store.get("s1").version == 2
+
+
+def test_sqlite_rejects_a_save_from_a_stale_copy(db_path):
+    store = SQLiteSessionStore(db_path)
+    store.save("s1", manager_with("hello"))
+
+    first, second = store.get("s1"), store.get("s1")
+    first.history.append({"role": "user", "content": "first"})
+    store.save("s1", first)
+    second.history.append({"role": "user", "content": "second"})
+    with pytest.raises(SessionConflict):
+        store.save("s1", second)
+    assert store.get("s1").conversation_history[-1]["content"] == "first"
+
+
+def test_sqlite_new_session_does_not_overwrite_an_existing_one(db_path):
+    store = SQLiteSessionStore(db_path)
+    store.save("s1", manager_with("original"))
+    with pytest.raises(SessionConflict):
+        store.save("s1", manager_with("intruder"))
+    assert store.get("s1").conversation_history[-1]["content"] == "original"
+
+
+def test_sqlite_concurrent_saves_across_connections_lose_no_update(db_path):
+    # Each store has its own connection, like separate worker processes sharing the file
+    SQLiteSessionStore(db_path).save("s1", manager_with())
+    stores = [SQLiteSessionStore(db_path) for _ in range(4)]
+    turns_per_worker = 25
+
+    def worker(store, name):
+        for turn in range(turns_per_worker):
+            while True:
+                manager = store.get("s1")
+                manager.history.append({"role": "user", "content": f"{name}-{turn}"})
+                try:
+                    store.save("s1", manager)
+                    break
+                except SessionConflict:
+                    continue
+
+    threads = [threading.Thread(target=worker, args=(store, f"w{i}")) for i, store in enumerate(stores)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    history = stores[0].get("s1").conversation_history
+    assert len(history) == len(stores) * turns_per_worker
+    assert stores[0].get("s1").version == len(stores) * turns_per_worker + 1
+
+
+def test_sqlite_adds_the_version_column_to_an_old_table(db_path):
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE sessions (session_id TEXT PRIMARY KEY, data TEXT NOT NULL, updated_at REAL NOT NULL)")
+    conn.commit()
+    conn.close()
+
+    store = SQLiteSessionStore(db_path)
+    store.save("s1", manager_with("hello"))
+    assert store.get("s1").version == 1
+
+
+def test_sqlite_read_refreshes_the_idle_timer_only_once_it_has_aged(db_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("app.sessions.time.time", lambda: now[0])
+    store = SQLiteSessionStore(db_path, ttl_seconds=100)
+    store.save("s1", manager_with())
+
+    def updated_at():
+        return store._conn.execute("SELECT updated_at FROM sessions WHERE session_id = 's1'").fetchone()[0]
+
+    now[0] += 5
+    store.get("s1")
+    assert updated_at() == 1000.0
+    now[0] += 10
+    store.get("s1")
+    assert updated_at() == 1015.0
+    now[0] += 95
+    assert store.get("s1") is not None
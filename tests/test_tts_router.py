@@ -0,0 +1,197 @@
+import time
+import asyncio
+import types
+
+import httpx
+import pytest
+
+from app.tts_router import TTSBackend, TTSRouter
+
+
+def router_with(handler, urls=("http://tts-a", "http://tts-b"), **kwargs):
+    """Router whose HTTP calls are answered by handler(request) instead of the network"""
+    http = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    kwargs.setdefault("failure_threshold", 1)
+    kwargs.setdefault("probe_interval", 0)
+    return TTSRouter(list(urls), types.SimpleNamespace(http=http), **kwargs)
+
+
+def open_backend(backend: TTSBackend, seconds_ago: float):
+    backend.state = TTSBackend.OPEN
+    backend.opened_at = time.monotonic() - seconds_ago
+
+
+def test_failures_open_the_circuit_at_the_threshold():
+    backend = TTSBackend("http://tts", failure_threshold=3, reset_seconds=30)
+    backend.record_failure()
+    backend.record_failure()
+    assert backend.state == TTSBackend.CLOSED
+    backend.record_failure()
+    assert backend.state == TTSBackend.OPEN
+    assert not backend.available(backend.opened_at + 1)
+
+
+def test_success_resets_the_failure_count():
+    backend = TTSBackend("http://tts", failure_threshold=2)
+    backend.record_failure()
+    backend.record_success(0.1)
+    backend.record_failure()
+    assert backend.state == TTSBackend.CLOSED
+
+
+def test_available_does_not_change_state():
+    backend = TTSBackend("http://tts", reset_seconds=30)
+    open_backend(backend, 60)
+    assert backend.available(time.monotonic())
+    assert backend.state == TTSBackend.OPEN
+
+
+def test_acquire_allows_one_trial_after_the_reset_time():
+    backend = TTSBackend("http://tts", reset_seconds=30)
+    open_backend(backend, 10)
+    assert not backend.acquire(time.monotonic())
+    open_backend(backend, 60)
+    assert backend.acquire(time.monotonic())
+    assert backend.state == TTSBackend.HALF_OPEN
+    assert not backend.acquire(time.monotonic())
+
+
+def test_half_open_trial_result_closes_or_reopens():
+    backend = TTSBackend("http://tts", failure_threshold=3, reset_seconds=30)
+    open_backend(backend, 60)
+    backend.acquire(time.monotonic())
+    backend.record_failure()
+    assert backend.state == TTSBackend.OPEN
+
+    open_backend(backend, 60)
+    backend.acquire(time.monotonic())
+    backend.record_success(0.2)
+    assert backend.state == TTSBackend.CLOSED
+
+
+def test_latency_is_a_moving_average_of_successes():
+    backend = TTSBackend("http://tts")
+    backend.latency = 1.0
+    backend.record_success(0.0)
+    assert backend.latency == 0.8
+    backend.record_probe(5.0)
+    assert backend.latency == 0.8
+
+
+def test_candidates_skip_open_backends_without_moving_them():
+    router = router_with(lambda request: httpx.Response(200))
+    fresh, expired = router.backends
+    open_backend(fresh, 0)
+    open_backend(expired, 3600)
+    assert router.candidates() == [expired]
+    assert fresh.state == expired.state == TTSBackend.OPEN
+
+
+def test_post_moves_only_the_tried_backend_to_half_open():
+    router = router_with(lambda request: httpx.Response(503), reset_seconds=30)
+    tried, untried = router.backends
+    open_backend(tried, 3600)
+    open_backend(untried, 3600)
+
+    assert asyncio.run(router.post(tried, {"text": "hi"})) is None
+    assert tried.state == TTSBackend.OPEN
+    assert untried.state == TTSBackend.OPEN
+    assert untried.available(time.monotonic())
+
+
+def test_post_success_closes_the_circuit():
+    router = router_with(lambda request: httpx.Response(200, content=b"RIFF"))
+    backend = router.backends[0]
+    open_backend(backend, 3600)
+    response = asyncio.run(router.post(backend, {"text": "hi"}))
+    assert response.content == b"RIFF"
+    assert backend.state == TTSBackend.CLOSED
+
+
+def test_post_skips_a_backend_whose_trial_is_in_flight():
+    calls = []
+    router = router_with(lambda request: calls.append(request) or httpx.Response(200))
+    backend = router.backends[0]
+    backend.state = TTSBackend.HALF_OPEN
+    assert asyncio.run(router.post(backend, {"text": "hi"})) is None
+    assert calls == []
+
+
+def test_post_releases_a_half_open_trial_when_cancelled():
+    async def hang(request):
+        await asyncio.sleep(60)
+
+    async def cancel_trial(router, backend):
+        task = asyncio.create_task(router.post(backend, {"text": "hi"}))
+        await asyncio.sleep(0.01)
+        assert backend.state == TTSBackend.HALF_OPEN
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    router = router_with(hang)
+    backend = router.backends[0]
+    open_backend(backend, 3600)
+    asyncio.run(cancel_trial(router, backend))
+    assert backend.state == TTSBackend.OPEN
+    assert backend in router.candidates()
+    assert backend.failures_total == 0
+
+
+def test_post_counts_an_unexpected_error_as_a_failure():
+    def broken(request):
+        raise RuntimeError("bug in the transport")
+
+    router = router_with(broken)
+    backend = router.backends[0]
+    open_backend(backend, 3600)
+    with pytest.raises(RuntimeError):
+        asyncio.run(router.post(backend, {"text": "hi"}))
+    assert backend.state == TTSBackend.OPEN
+    assert backend.failures_total == 1
+
+
+def test_probe_makes_an_open_circuit_due_for_a_trial_without_closing_it():
+    router = router_with(lambda request: httpx.Response(404), failure_threshold=3, reset_seconds=30)
+    backend = router.backends[0]
+    for _ in range(3):
+        backend.record_failure()
+    assert not backend.available(time.monotonic())
+    backend.latency = 2.0
+
+    asyncio.run(router.probe(backend))
+    assert backend.state == TTSBackend.OPEN
+    assert backend.failures == 3
+    assert backend.available(time.monotonic())
+    assert backend.latency == 2.0
+    assert backend.probe_latency is not None
+
+
+def test_probe_leaves_a_closed_circuit_and_its_failures_alone():
+    router = router_with(lambda request: httpx.Response(200), failure_threshold=3)
+    backend = router.backends[0]
+    backend.record_failure()
+    backend.record_failure()
+    asyncio.run(router.probe(backend))
+    backend.record_failure()
+    assert backend.state == TTSBackend.OPEN
+
+
+def test_only_a_synthesis_success_closes_a_probed_circuit():
+    router = router_with(lambda request: httpx.Response(200 if request.url.path == "/" else 503), failure_threshold=3)
+    backend = router.backends[0]
+    open_backend(backend, 0)
+    asyncio.run(router.probe(backend))
+    assert asyncio.run(router.post(backend, {"text": "hi"})) is None
+    assert backend.state == TTSBackend.OPEN
+    assert not backend.available(time.monotonic())
+
+
+def test_failed_probe_counts_as_a_failure():
+    def unreachable(request):
+        raise httpx.ConnectError("refused", request=request)
+
+    router = router_with(unreachable)
+    backend = router.backends[0]
+    asyncio.run(router.probe(backend))
+    assert backend.state == TTSBackend.OPEN
@@ -0,0 +1,68 @@
+import asyncio
+import threading
+import types
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.clients import ClientPool
+
+
+class FakeCompletions:
+    """Chat completions that take a while, so concurrent turns overlap"""
+
+    async def create(self, stream=False, **params):
+        await asyncio.sleep(0.05)
+        content = "reply to " + params["messages"][-1]["content"]
+        if not stream:
+            message = types.SimpleNamespace(content=content)
+            return types.SimpleNamespace(choices=[types.SimpleNamespace(message=message)], usage=None)
+
+        async def chunks():
+            for word in content.split(" "):
+                await asyncio.sleep(0.02)
+                delta = types.SimpleNamespace(content=word + " ")
+                yield types.SimpleNamespace(choices=[types.SimpleNamespace(delta=delta)], usage=None)
+        return chunks()
+
+
+@pytest.fixture
+def client(monkeypatch):
+    fake = types.SimpleNamespace(chat=types.SimpleNamespace(completions=FakeCompletions()))
+    monkeypatch.setattr(ClientPool, "openai", property(lambda self: fake))
+    from app.main import app, tts_router
+    monkeypatch.setattr(tts_router, "probe_interval", 0)
+    with TestClient(app) as client:
+        yield client
+
+
+def test_concurrent_http_and_ws_turns_do_not_interleave(client):
+    session_id = client.post("/api/start-conversation", json={
+        "system_role": "sales specialist", "assistant_role": "customer", "scenario": "negotiation"
+    }).json()["session_id"]
+    headers = {"X-Session-ID": session_id}
+
+    responses = []
+    threads = [
+        threading.Thread(target=lambda: responses.append(
+            client.post("/api/send-message/stream", json={"content": "sse"}, headers=headers)
+        )),
+        threading.Thread(target=lambda: responses.append(
+            client.post("/api/send-message", json={"content": "plain"}, headers=headers)
+        ))
+    ]
+    with client.websocket_connect(f"/ws?session_id={session_id}") as websocket:
+        for thread in threads:
+            thread.start()
+        websocket.send_json({"action": "message", "content": "ws", "stream": True})
+        while websocket.receive_json()["type"] != "response":
+            pass
+        for thread in threads:
+            thread.join()
+
+    assert [response.status_code for response in responses] == [200, 200]
+    from app.main import session_store
+    turns = session_store.get(session_id).conversation_history[1:]
+    assert [message["role"] for message in turns] == ["user", "assistant"] * 3
+    for question, answer in zip(turns[::2], turns[1::2]):
+        assert answer["content"].strip() == "reply to " + question["content"]